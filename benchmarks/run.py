@@ -0,0 +1,214 @@
+"""Benchmark suite for the hot paths of juggy.algo and the payload path of juggy.main.
+
+Usage:
+    python -m benchmarks.run                          # Run and print the results
+    python -m benchmarks.run --save baseline.json     # Also save them as a baseline
+    python -m benchmarks.run --compare baseline.json  # Flag regressions against a baseline, exits 1 if any
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import timeit
+from collections.abc import Callable
+from typing import TypedDict, cast
+
+from loguru import logger
+
+import juggy.algo as a
+import juggy.archive as ar
+import juggy.export as ex
+import juggy.hevy as h
+import juggy.loading as ld
+import juggy.log as lg
+import juggy.main as m
+import juggy.payload as p
+from benchmarks import synthetic as s
+from juggy import util as u
+
+ROSTER_SIZE = 1000
+HISTORY_YEARS = 3
+# A benchmark is a regression if it got slower than the baseline by more than this ratio
+DEFAULT_THRESHOLD = 0.2
+
+
+class Result(TypedDict):
+    """The timing of one benchmark."""
+
+    # Best time of one run, in seconds
+    best: float
+    runs: int
+
+
+def _all_weeks() -> list[tuple[tuple[float, int], ...]]:
+    return [tuple(week) for wave in a.TEMPLATE for week in wave]
+
+
+def _benchmarks() -> dict[str, Callable[[], object]]:
+    """Set up the benchmarks.  Synthetic data is generated here, outside of the timed code."""
+    roster = s.make_roster(ROSTER_SIZE)
+    shared_roster = s.make_roster(ROSTER_SIZE, distinct_tms=20)
+    history = s.make_history(roster[0], HISTORY_YEARS)
+    weeks = _all_weeks()
+    weights = [45 + i * 0.37 for i in range(10_000)]
+    table = ld.build_table({"unit": "kg", "plates": [25, 20, 20, 15, 10, 5, 2.5, 1.25], "rounding": "nearest"})
+    lifts = a.generate_lifts(list(weeks[2]), 285)
+    multiplier = a.TEMPLATE[0][2][-1][0]
+
+    def generate_lifts_roster() -> None:
+        for athlete in roster:
+            for week in weeks:
+                a.generate_lifts(list(week), athlete["squat_tm"])
+
+    def generate_sets_roster() -> None:
+        p.generate_lifts.cache_clear()
+        p.generate_sets.cache_clear()
+        for athlete in shared_roster:
+            for week in weeks:
+                p.generate_sets(week, athlete["squat_tm"])
+
+    def round_weight() -> None:
+        for weight in weights:
+            u.round_weight(weight)
+
+    def snap_weight() -> None:
+        for weight in weights:
+            ld.snap_weight(table, weight)
+
+    def lifts_to_hevy_sets() -> None:
+        for _ in range(10_000):
+            p.lifts_to_hevy_sets(lifts)
+
+    def build_routine_payloads() -> None:
+        p.generate_lifts.cache_clear()
+        p.generate_sets.cache_clear()
+        for athlete in roster[:100]:
+            for week in weeks:
+                exercises = [p.build_exercise("D04AC939", week, athlete["squat_tm"])]
+                p.serialize_routine("Squat Day", 1, p.merge_accessories("Squat Day", exercises, exercises))
+
+    def find_week3_top_sets_reps() -> None:
+        m.find_week3_top_sets_reps(roster[0], multiplier, history)
+
+    archive_file = os.path.join(tempfile.mkdtemp(), "history.jca")
+    ar.write_archive(history, archive_file)
+
+    def find_week3_top_sets_reps_archive() -> None:
+        with ar.open_archive(archive_file) as archive:
+            m.find_week3_top_sets_reps_in_archive(roster[0], multiplier, archive)
+
+    routines: list[h.HevyRoutine] = [
+        {"id": i, "title": workout["title"], "notes": "", "folder_id": 1, "exercises": workout["exercises"]}
+        for i, workout in enumerate(history[:1000])
+    ]
+
+    def debug_log_eager() -> None:
+        # The f-string logging replaced by juggy.log, kept as a reference for the overhead it removed
+        for routine in routines:
+            logger.debug(f"Routine: {routine}")
+            logger.debug(f"Exercises: {routine['exercises']}")
+
+    def debug_log_lazy() -> None:
+        for routine in routines:
+            logger.debug("Routine {routine_id}", routine_id=routine["id"], routine=routine)
+            logger.debug("Exercises of routine {routine_id}", routine_id=routine["id"], exercises=routine["exercises"])
+
+    def get_exercises_from_routine() -> None:
+        for routine in routines:
+            h.get_exercises_from_routine(str(routine["id"]), [routine])
+
+    def export_csv() -> None:
+        ex.export(ex.iter_sessions(roster[:100], [1, 2, 3, 4], [1, 2, 3, 4]), "csv", io.StringIO())
+
+    return {
+        "generate_lifts_roster": generate_lifts_roster,
+        "generate_sets_roster": generate_sets_roster,
+        "round_weight": round_weight,
+        "snap_weight": snap_weight,
+        "lifts_to_hevy_sets": lifts_to_hevy_sets,
+        "build_routine_payloads": build_routine_payloads,
+        "find_week3_top_sets_reps": find_week3_top_sets_reps,
+        "find_week3_top_sets_reps_archive": find_week3_top_sets_reps_archive,
+        "debug_log_eager": debug_log_eager,
+        "debug_log_lazy": debug_log_lazy,
+        "get_exercises_from_routine": get_exercises_from_routine,
+        "export_csv": export_csv,
+    }
+
+
+def run(names: list[str] | None = None, repeat: int = 5) -> dict[str, Result]:
+    """Run the benchmarks (all, or the given ones) and return the best time of each."""
+    results: dict[str, Result] = {}
+    for name, benchmark in _benchmarks().items():
+        if names and name not in names:
+            continue
+        timer = timeit.Timer(benchmark)
+        results[name] = {"best": min(timer.repeat(repeat=repeat, number=1)), "runs": repeat}
+    return results
+
+
+def compare(baseline: dict[str, Result], current: dict[str, Result], threshold: float = DEFAULT_THRESHOLD) -> list[str]:
+    """Compare results against a baseline.
+
+    returns:
+        The names of the benchmarks that got slower by more than threshold (a ratio, 0.2 is 20%).
+    """
+    return [
+        name
+        for name, result in current.items()
+        if name in baseline and result["best"] > baseline[name]["best"] * (1 + threshold)
+    ]
+
+
+def _print_results(results: dict[str, Result], baseline: dict[str, Result] | None) -> None:
+    for name, result in results.items():
+        line = f"{name:<28}{result['best'] * 1000:>12.3f} ms"
+        if baseline and name in baseline:
+            line += f"{result['best'] / baseline[name]['best']:>10.2f}x baseline"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--save", type=str, help="Save the results as a baseline to this file")
+    parser.add_argument("--compare", type=str, help="Compare the results against the baseline in this file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Slowdown ratio over the baseline that counts as a regression",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs of each benchmark, the best is kept")
+    parser.add_argument("names", nargs="*", help="Benchmarks to run (default: all)")
+    args = parser.parse_args()
+
+    # Warnings about missing accessories would drown the results.  A handler is still installed, so that log calls
+    # are filtered by level as they are in real runs.
+    lg.setup("ERROR", stream=open(os.devnull, "w"))
+
+    results = run(args.names, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = cast(dict[str, Result], json.load(file))
+    _print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=4)
+        print(f"Saved results to {args.save}")
+
+    if baseline is not None:
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"Regressions beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
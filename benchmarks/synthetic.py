@@ -0,0 +1,84 @@
+"""Deterministic synthetic data for benchmarks: large rosters and multi-year workout histories."""
+
+import random
+from datetime import UTC, datetime, timedelta
+from typing import cast
+
+import juggy.algo as a
+import juggy.config as c
+import juggy.hevy as h
+import juggy.payload as p
+
+EXERCISE_IDS = {"squat": "D04AC939", "bench": "79D0BB3A", "deadlift": "C6272009", "ohp": "7B8D84E8"}
+# Accessories that show up in workouts between the main lifts
+ACCESSORY_IDS = [f"ACC{i:05d}" for i in range(40)]
+
+
+def make_roster(size: int, seed: int = 0, distinct_tms: int | None = None) -> list[c.Config]:
+    """Generate athletes with plausible training maxes in lbs.
+
+    If distinct_tms is given, training maxes are drawn from that many values per lift, to model athletes sharing maxes.
+    """
+    rng = random.Random(seed)
+
+    def tm(low: int, high: int) -> float:
+        if distinct_tms:
+            return float(low + (rng.randrange(distinct_tms) * (high - low)) // distinct_tms)
+        return float(rng.randrange(low, high, 5))
+
+    return [
+        cast(
+            c.Config,
+            {
+                "api_key": f"key-{i}",
+                "name": f"athlete-{i}",
+                "squat_tm": tm(135, 500),
+                "bench_tm": tm(95, 350),
+                "deadlift_tm": tm(185, 600),
+                "ohp_tm": tm(65, 225),
+                "folder": "Juggy",
+                **{f"{lift}_exercise_id": exercise_id for lift, exercise_id in EXERCISE_IDS.items()},
+            },
+        )
+        for i in range(size)
+    ]
+
+
+def make_history(athlete: c.Config, years: int, wave: int = 1, seed: int = 0) -> list[h.HevyWorkout]:
+    """Generate years of workouts (4 per week), newest first as the API returns them.
+
+    Only the oldest workouts contain the week 3 top sets of the given wave, which is the worst case for a backwards
+    search."""
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 6, 7, tzinfo=UTC)
+    workouts: list[h.HevyWorkout] = []
+    week3 = tuple(a.TEMPLATE[wave - 1][2])
+    for i in range(years * 52 * 4):
+        day = start + timedelta(days=(i // 4) * 7 + (i % 4) * 2)
+        lift = list(EXERCISE_IDS)[i % 4]
+        # The first 4 workouts are the week 3 of the wave.  Everything after is unrelated training, with maxes high
+        # enough that its top sets never match.
+        protocol = week3 if i < 4 else tuple(a.TEMPLATE[rng.randrange(4)][rng.randrange(2)])
+        training_max = athlete[f"{lift}_tm"] * (1 if i < 4 else rng.uniform(1.5, 2))  # type: ignore
+        main = p.build_exercise(EXERCISE_IDS[lift], protocol, training_max, 5, lift == "deadlift")
+        main["sets"][-1]["reps"] += rng.randrange(0, 5)
+        accessories: list[h.HevyExercise] = [
+            {
+                "exercise_template_id": rng.choice(ACCESSORY_IDS),
+                "notes": "",
+                "sets": [{"type": "normal", "weight_kg": 20.0, "reps": 12} for _ in range(3)],
+            }
+            for _ in range(3)
+        ]
+        workouts.append(
+            {
+                "id": f"workout-{i}",
+                "title": f"{lift} day",
+                "is_private": False,
+                "start_time": day.isoformat(),
+                "end_time": (day + timedelta(hours=1)).isoformat(),
+                "exercises": [main, *accessories],
+            }
+        )
+    workouts.reverse()
+    return workouts
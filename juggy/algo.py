@@ -1,5 +1,6 @@
 """Implementation of the Juggernaut method algorithm"""
 
+from juggy.loading import LoadTable, snap_weight
 from juggy.util import round_weight
 
 DELOAD_WEEK = [(0.40, 5), (0.50, 5), (0.60, 5)]
@@ -47,23 +48,38 @@ TEMPLATE = [
 ]
 
 
+def load_weight(weight: float, round: int = 5, table: LoadTable | None = None) -> float:
+    """Turn a computed weight into one that can be loaded: snapped to the gym's load table if there is one,
+    otherwise rounded up to a multiple of round."""
+    if table:
+        return snap_weight(table, weight)
+    return round_weight(weight, round)
+
+
 def generate_base_lifts(
-    protocol: list[tuple[float, int]], training_max: float, round: int = 5
+    protocol: list[tuple[float, int]], training_max: float, round: int = 5, table: LoadTable | None = None
 ) -> list[tuple[float, int]]:
     """Generate a list of lifts based on the protocol and training max."""
     lifts = []
     for ratio, reps in protocol:
-        weight = round_weight(training_max * ratio, round)
+        weight = load_weight(training_max * ratio, round, table)
         lifts.append((weight, reps))
     return lifts
 
 
 def generate_warmups(
-    work_set: float, round: int = 5, is_deadlift: bool = False, warmup_sets: int = 4
+    work_set: float,
+    round: int = 5,
+    is_deadlift: bool = False,
+    warmup_sets: int = 4,
+    table: LoadTable | None = None,
 ) -> list[tuple[float, int] | None]:
     """Generate a list of warmups based on the work set."""
 
-    first_set = 65 if is_deadlift else 45
+    if table:
+        first_set = table.deadlift_warmup_start if is_deadlift else table.warmup_start
+    else:
+        first_set = 65 if is_deadlift else 45
     inc = (work_set - first_set) / warmup_sets
     warmups: list[tuple[float, int] | None] = [(first_set, 10)]
     weight: float = first_set
@@ -71,26 +87,31 @@ def generate_warmups(
     for i in range(warmup_sets - 1):
         if i >= len(WARMUP_REPS):
             break
-        weight = round_weight(weight + inc, round)
+        weight = load_weight(weight + inc, round, table)
         warmups.append((weight, WARMUP_REPS[i]))
     return warmups
 
 
 def generate_lifts(
-    protocol: list[tuple[float, int]], training_max: float, round: int = 5, is_deadlift: bool = False
+    protocol: list[tuple[float, int]],
+    training_max: float,
+    round: int = 5,
+    is_deadlift: bool = False,
+    table: LoadTable | None = None,
 ) -> list[tuple[float, int] | None]:
     """Generate the main lifts of the day.
 
     This function generates a list of lifts based on the protocol and training max.
     It also generates a list of warmups based on the work set.  Warmups and main lifts are partitioned by None.
+    If a load table is given, weights are in its unit and snapped to its achievable loads, and round is ignored.
 
     Example:
         >>> generate_lifts(TEMPLATE[0][2], 285, 5, False)
         [(45, 10), (70, 5), (95, 3), (120, 2), None, (145, 5), (175, 3), (200, 1), (215, 10)]
     """
-    base_lifts = generate_base_lifts(protocol, training_max, round)
+    base_lifts = generate_base_lifts(protocol, training_max, round, table)
     work_set = base_lifts[0][0]
-    warmups = generate_warmups(work_set, round, is_deadlift)
+    warmups = generate_warmups(work_set, round, is_deadlift, table=table)
     result: list[tuple[float, int] | None] = list(warmups)
     result.append(None)
     result.extend(base_lifts)
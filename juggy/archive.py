@@ -0,0 +1,198 @@
+"""A compact, columnar, memory-mapped archive of a lifter's workout history, for analytics.
+
+Every set of every workout is a row, stored column by column in fixed-width little-endian arrays:
+
+    timestamp      int64    workout start, in seconds since the epoch
+    exercise       uint32   index into the archive's exercise template ID table
+    set_index      uint16   position of the set within its exercise, starting at 0
+    weight_kg      float64  NaN for sets without a weight
+    reps           uint16   0 for sets without reps
+
+Rows are in chronological order, and the sets of an exercise are consecutive.  Each such run of sets also gets an entry
+in a run index, with the same layout:
+
+    run_exercise   uint32   the exercise of the run
+    run_last_row   uint32   the row of its last set
+
+so searches visit one entry per exercise performed rather than one per set, and jump straight to the rows they need.
+Opening an archive maps the file and exposes the columns as memoryviews over the map, so nothing is copied or parsed and
+scans only touch the columns they need."""
+
+import json
+import math
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Container, Iterable, Iterator
+from contextlib import contextmanager
+from typing import NamedTuple
+
+import juggy.algo as a
+import juggy.hevy as h
+from juggy import util as u
+
+MAGIC = b"JUGGYARC"
+VERSION = 1
+# magic, version, row count, run count, length of the exercise ID table
+_HEADER = struct.Struct("<8sIQQI")
+# (array typecode, item size) of each row column, then of each run column, in file order
+_COLUMNS = [("q", 8), ("I", 4), ("H", 2), ("d", 8), ("H", 2)]
+_RUN_COLUMNS = [("I", 4), ("I", 4)]
+
+
+class Archive(NamedTuple):
+    """An open archive.  The columns are only valid until the archive is closed."""
+
+    exercise_ids: list[str]
+    timestamps: memoryview
+    exercises: memoryview
+    set_indexes: memoryview
+    weights_kg: memoryview
+    reps: memoryview
+    run_exercises: memoryview
+    run_last_rows: memoryview
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _check_byte_order() -> None:
+    # Columns are written and mapped in native byte order, which is only the file's on little-endian machines
+    if sys.byteorder != "little":
+        raise RuntimeError("Workout archives are only supported on little-endian machines")
+
+
+def _timestamp(value: str) -> int:
+    return int(h.parse_time(value).timestamp())
+
+
+def write_archive(workouts: Iterable[h.HevyWorkout], filename: str) -> int:
+    """Write the workouts to an archive file, replacing it.  Returns the number of rows (sets) written."""
+    _check_byte_order()
+    timestamps, exercises, set_indexes, reps = array("q"), array("I"), array("H"), array("H")
+    weights_kg = array("d")
+    run_exercises, run_last_rows = array("I"), array("I")
+    columns: list[array] = [timestamps, exercises, set_indexes, weights_kg, reps, run_exercises, run_last_rows]
+    codes: dict[str, int] = {}
+
+    for workout in sorted(workouts, key=lambda w: _timestamp(w["start_time"])):
+        timestamp = _timestamp(workout["start_time"])
+        for exercise in workout["exercises"]:
+            code = codes.setdefault(exercise["exercise_template_id"], len(codes))
+            for i, s in enumerate(exercise["sets"]):
+                timestamps.append(timestamp)
+                exercises.append(code)
+                set_indexes.append(i)
+                weight = s.get("weight_kg")
+                weights_kg.append(math.nan if weight is None else weight)
+                reps.append(s.get("reps") or 0)
+            if exercise["sets"]:
+                run_exercises.append(code)
+                run_last_rows.append(len(timestamps) - 1)
+
+    table = json.dumps(list(codes)).encode()
+    with open(filename, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, len(timestamps), len(run_exercises), len(table)))
+        file.write(table)
+        for column in columns:
+            file.write(b"\0" * (_align(file.tell()) - file.tell()))
+            column.tofile(file)
+    return len(timestamps)
+
+
+@contextmanager
+def open_archive(filename: str) -> Iterator[Archive]:
+    """Memory-map an archive for reading."""
+    _check_byte_order()
+
+    with open(filename, "rb") as file:
+        mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    views: list[memoryview] = []
+    try:
+        if len(mm) < _HEADER.size:
+            raise ValueError(f"{filename} is not a version {VERSION} workout archive")
+        magic, version, rows, runs, table_length = _HEADER.unpack_from(mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{filename} is not a version {VERSION} workout archive")
+        offset = _HEADER.size
+        exercise_ids = json.loads(mm[offset : offset + table_length])
+        offset += table_length
+
+        buffer = memoryview(mm)
+        views.append(buffer)
+        for (typecode, size), count in [(column, rows) for column in _COLUMNS] + [(c, runs) for c in _RUN_COLUMNS]:
+            offset = _align(offset)
+            views.append(buffer[offset : offset + count * size].cast(typecode))  # type: ignore[call-overload]
+            offset += count * size
+        yield Archive(exercise_ids, *views[1:])
+    finally:
+        # The map can't be closed while views of it exist
+        for view in reversed(views):
+            view.release()
+        mm.close()
+
+
+def rows(archive: Archive) -> int:
+    return len(archive.timestamps)
+
+
+def _runs_of_exercises_reversed(archive: Archive, codes: Container[int]) -> Iterator[tuple[int, int, int]]:
+    """The runs of sets of the given exercises, newest first, as (exercise code, first row, last row)."""
+    run_exercises, run_last_rows = archive.run_exercises, archive.run_last_rows
+    for run in range(len(run_exercises) - 1, -1, -1):
+        code = run_exercises[run]
+        if code in codes:
+            yield code, run_last_rows[run - 1] + 1 if run else 0, run_last_rows[run]
+
+
+def find_top_sets_reps(archive: Archive, targets: dict[str, tuple[str, float]]) -> dict[str, int | None]:
+    """For each target, find the reps of the most recent top (last) set of an exercise at a given weight.
+
+    Args:
+        targets: (exercise template ID, top set weight in kg) keyed by any name, e.g. {"squat": ("D04AC939", 97.5)}
+
+    returns:
+        The reps keyed by the same names, None for targets that were not found.
+    """
+    code_of = {exercise_id: code for code, exercise_id in enumerate(archive.exercise_ids)}
+    # code -> [(name, weight)]
+    wanted: dict[int, list[tuple[str, float]]] = {}
+    for name, (exercise_id, weight_kg) in targets.items():
+        if exercise_id in code_of:
+            wanted.setdefault(code_of[exercise_id], []).append((name, weight_kg))
+
+    found: dict[str, int | None] = dict.fromkeys(targets)
+    remaining = sum(len(lifts) for lifts in wanted.values())
+    weights_kg, reps = archive.weights_kg, archive.reps
+    for code, _, row in _runs_of_exercises_reversed(archive, wanted):
+        if not remaining:
+            break
+        for name, weight_kg in wanted[code]:
+            if found[name] is None and u.weights_equal(weights_kg[row], weight_kg):
+                found[name] = reps[row]
+                remaining -= 1
+    return found
+
+
+def max_one_rep_max(archive: Archive, exercise_id: str, since: int | None = None) -> float | None:
+    """The best estimated one rep max (see algo.compute_one_rep_max) of all sets of an exercise, optionally only
+    since a timestamp.  None if the exercise was never done with a weight."""
+    if exercise_id not in archive.exercise_ids:
+        return None
+    code = archive.exercise_ids.index(exercise_id)
+    weights_kg, reps, timestamps = archive.weights_kg, archive.reps, archive.timestamps
+    best = None
+    for _, first, last in _runs_of_exercises_reversed(archive, {code}):
+        if since is not None and timestamps[last] < since:
+            # Rows are chronological, everything further back is older still
+            break
+        for row in range(first, last + 1):
+            weight = weights_kg[row]
+            if math.isnan(weight) or not reps[row]:
+                continue
+            orm = a.compute_one_rep_max(weight, reps[row])
+            if best is None or orm > best:
+                best = orm
+    return best
@@ -0,0 +1,132 @@
+"""Local cache of the Hevy exercise template catalog, used to look up and validate exercise IDs."""
+
+import json
+import os
+import time
+from typing import TypedDict, cast
+
+from loguru import logger
+
+import juggy.config as c
+import juggy.hevy as h
+
+CATALOG_FILE = "exercise_templates.json"
+# How long a synced catalog is trusted before we ask the API whether it changed
+MAX_AGE_SECONDS = 24 * 60 * 60
+# The ETag only covers the first page of the catalog, so a change further in (a custom template, usually) may not change
+# it.  The catalog is downloaded again at least this often, whatever the ETag says.
+MAX_DOWNLOAD_AGE_SECONDS = 7 * 24 * 60 * 60
+
+MAIN_LIFTS = ["squat", "bench", "deadlift", "ohp"]
+
+
+class ExerciseCatalog(TypedDict):
+    """The synced exercise template catalog, as stored on disk."""
+
+    # When the catalog was last known to be up to date
+    fetched_at: float
+    # When it was last downloaded in full
+    downloaded_at: float
+    etag: str | None
+    templates: list[h.HevyExerciseTemplate]
+
+
+class CatalogIndex(TypedDict):
+    """Lookup tables over an ExerciseCatalog."""
+
+    by_id: dict[str, h.HevyExerciseTemplate]
+    # Titles aren't unique: a custom template often has the same title as a built-in one
+    by_title: dict[str, list[h.HevyExerciseTemplate]]
+
+
+def save_catalog(catalog: ExerciseCatalog, filename: str = CATALOG_FILE) -> None:
+    with open(filename, "w") as file:
+        json.dump(catalog, file)
+
+
+def load_catalog(filename: str = CATALOG_FILE) -> ExerciseCatalog | None:
+    """Load the cached catalog, or None if it has never been synced."""
+    if not os.path.exists(filename):
+        return None
+    with open(filename) as file:
+        return cast(ExerciseCatalog, json.load(file))
+
+
+def sync_catalog(
+    api_key: str,
+    filename: str = CATALOG_FILE,
+    max_age: float = MAX_AGE_SECONDS,
+    force: bool = False,
+    max_download_age: float = MAX_DOWNLOAD_AGE_SECONDS,
+) -> ExerciseCatalog:
+    """Bring the local catalog up to date and return it.
+
+    A cached catalog younger than max_age is used as is.  An older one is revalidated with a single conditional
+    request, and the full catalog is only downloaded again if it actually changed, or if it was last downloaded over
+    max_download_age ago."""
+    catalog = load_catalog(filename)
+    now = time.time()
+    if catalog and not force:
+        if now - catalog["fetched_at"] < max_age:
+            logger.debug("Using cached exercise catalog from {filename}", filename=filename)
+            return catalog
+        # Catalogs saved before downloads were dated are downloaded again
+        if now - catalog.get("downloaded_at", 0) < max_download_age:
+            changed, _ = h.exercise_templates_changed(api_key, catalog["etag"])
+            if not changed:
+                logger.debug("Exercise catalog unchanged, refreshing timestamp")
+                catalog["fetched_at"] = now
+                save_catalog(catalog, filename)
+                return catalog
+
+    logger.info("Downloading exercise catalog")
+    templates, etag = h.get_exercise_templates(api_key)
+    catalog = {"fetched_at": now, "downloaded_at": now, "etag": etag, "templates": templates}
+    save_catalog(catalog, filename)
+    logger.info("Saved {count} exercise templates to {filename}", count=len(catalog["templates"]), filename=filename)
+    return catalog
+
+
+def _normalize_title(title: str) -> str:
+    return " ".join(title.split()).casefold()
+
+
+def build_index(catalog: ExerciseCatalog) -> CatalogIndex:
+    """Index the catalog by exercise template ID and by normalized title."""
+    by_title: dict[str, list[h.HevyExerciseTemplate]] = {}
+    for t in catalog["templates"]:
+        by_title.setdefault(_normalize_title(t["title"]), []).append(t)
+    return {"by_id": {t["id"]: t for t in catalog["templates"]}, "by_title": by_title}
+
+
+def find_by_id(index: CatalogIndex, exercise_id: str) -> h.HevyExerciseTemplate | None:
+    return index["by_id"].get(exercise_id)
+
+
+def find_by_name(index: CatalogIndex, name: str) -> list[h.HevyExerciseTemplate]:
+    """Find the exercise templates with exactly the given title, ignoring case and whitespace.  Empty if none."""
+    return index["by_title"].get(_normalize_title(name), [])
+
+
+def search(index: CatalogIndex, text: str) -> list[h.HevyExerciseTemplate]:
+    """Find all exercise templates whose title contains the given text, ignoring case, in catalog order."""
+    needle = _normalize_title(text)
+    return [t for t in index["by_id"].values() if needle in _normalize_title(t["title"])]
+
+
+def validate_config(config: c.Config, index: CatalogIndex) -> list[str]:
+    """Check every exercise ID referenced by the config against the catalog.
+
+    returns:
+        A list of human readable problems, empty if all IDs are valid.
+    """
+    problems = []
+    for lift in MAIN_LIFTS:
+        exercise_id = config[f"{lift}_exercise_id"]  # type: ignore
+        if find_by_id(index, exercise_id) is None:
+            problems.append(f"{lift}_exercise_id {exercise_id} is not a known exercise template")
+        for accessory in config.get(f"{lift}_accessories", []):  # type: ignore
+            accessory_id = accessory["exercise_template_id"]
+            if find_by_id(index, accessory_id) is None:
+                problems.append(f"{lift} accessory {accessory_id} is not a known exercise template")
+    return problems
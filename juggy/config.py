@@ -1,13 +1,17 @@
 import json
+from collections.abc import Iterable, Iterator
 from typing import NotRequired, TypedDict, cast
 
 from juggy.hevy import HevyExercise
+from juggy.loading import LoadingRules, LoadTable, build_table
 
 
 class Config(TypedDict):
     """Configuration Settings."""
 
     api_key: str
+    # Identifies the athlete in exports and roster runs.  Required, and unique, for the athletes of a roster.
+    name: NotRequired[str]
 
     squat_tm: float
     bench_tm: float
@@ -27,6 +31,11 @@ class Config(TypedDict):
     deadlift_accessories: NotRequired[list[HevyExercise]]
     ohp_accessories: NotRequired[list[HevyExercise]]
 
+    # Equipment per gym, keyed by gym name.  Without it, weights are in lbs and rounded up to 5 lbs.
+    gyms: NotRequired[dict[str, LoadingRules]]
+    # The gym to program for when none is given on the command line
+    gym: NotRequired[str]
+
 
 def save_config(config: Config, filename: str = "config.json") -> None:
     with open(filename, "w") as file:
@@ -36,3 +45,45 @@ def save_config(config: Config, filename: str = "config.json") -> None:
 def load_config(filename: str = "config.json") -> Config:
     with open(filename) as file:
         return cast(Config, json.load(file))
+
+
+def athlete_name(config: Config) -> str:
+    """The name of an athlete.  A lone config may leave it out, and goes by its folder instead."""
+    return config.get("name", config["folder"])
+
+
+def load_roster(filename: str) -> Iterator[Config]:
+    """Stream the athletes of a roster, a JSON Lines file with one config per line.  Blank lines are skipped.
+
+    Athletes are told apart by name (in queued jobs, exports and training max changes), so every athlete must have one,
+    and no two the same."""
+    names: set[str] = set()
+    with open(filename) as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            athlete = cast(Config, json.loads(line))
+            name = athlete.get("name")
+            if not name:
+                raise ValueError(f"{filename}:{line_number}: athlete has no name")
+            if name in names:
+                raise ValueError(f"{filename}:{line_number}: athlete name {name!r} is already taken")
+            names.add(name)
+            yield athlete
+
+
+def save_roster(athletes: Iterable[Config], filename: str) -> None:
+    with open(filename, "w") as file:
+        for athlete in athletes:
+            file.write(json.dumps(athlete) + "\n")
+
+
+def get_load_table(config: Config, gym: str | None = None) -> LoadTable | None:
+    """Get the load table for the given gym, or the config's default gym.  None means the legacy lbs behavior."""
+    gym = gym or config.get("gym")
+    if not gym:
+        return None
+    gyms = config.get("gyms", {})
+    if gym not in gyms:
+        raise ValueError(f"Unknown gym: {gym}")
+    return build_table(gyms[gym])
@@ -0,0 +1,190 @@
+"""Export generated programs to CSV, JSON Lines or ICS files, without touching the Hevy API.
+
+Programs are generated lazily, one session at a time, and each session is written out as soon as it is generated, so
+memory use stays flat no matter how many athletes and weeks are exported."""
+
+import csv
+import json
+from collections.abc import Iterable, Iterator
+from datetime import UTC, date, datetime, timedelta
+from typing import TextIO, TypedDict
+
+import juggy.algo as a
+import juggy.config as c
+import juggy.payload as p
+
+FORMATS = ["csv", "jsonl", "ics"]
+
+# (lift, routine title, is deadlift)
+LIFTS = [
+    ("squat", "Squat Day", False),
+    ("bench", "Bench Day", False),
+    ("deadlift", "Deadlift Day", True),
+    ("ohp", "OHP Day", False),
+]
+# Days after the start of a week on which each lift is trained, for calendar exports
+DAY_OFFSETS = {"squat": 0, "bench": 1, "deadlift": 3, "ohp": 4}
+
+CSV_FIELDS = [
+    "athlete",
+    "wave",
+    "week",
+    "lift",
+    "title",
+    "exercise_template_id",
+    "set_number",
+    "type",
+    "weight",
+    "unit",
+    "weight_kg",
+    "reps",
+]
+
+
+class ExportSet(TypedDict):
+    """A single set of an exported session."""
+
+    set_number: int
+    type: str
+    # In the session's unit
+    weight: float
+    weight_kg: float
+    reps: int
+
+
+class Session(TypedDict):
+    """One main lift session of one athlete."""
+
+    athlete: str
+    wave: int
+    week: int
+    # Position of the week within the export, starting at 0.  Used to lay sessions out on a calendar.
+    schedule_week: int
+    lift: str
+    title: str
+    exercise_template_id: str
+    unit: str
+    sets: list[ExportSet]
+
+
+def iter_sessions(
+    athletes: Iterable[c.Config], waves: list[int], weeks: list[int], gym: str | None = None
+) -> Iterator[Session]:
+    """Generate the sessions of every athlete, for every given wave and week, in order."""
+    for athlete in athletes:
+        name = c.athlete_name(athlete)
+        table = c.get_load_table(athlete, gym)
+        unit = table.unit if table else "lb"
+        schedule_week = 0
+        for wave in waves:
+            for week in weeks:
+                protocol = tuple(a.TEMPLATE[wave - 1][week - 1])
+                for lift, title, is_deadlift in LIFTS:
+                    training_max = athlete[f"{lift}_tm"]  # type: ignore
+                    lifts = p.generate_lifts(protocol, training_max, p.ROUND_WEIGHT_PRECISION, is_deadlift, table)
+                    # The same sets as programmed in Hevy, along with their weights in the session's unit
+                    weights = [lift[0] for lift in lifts if lift is not None]
+                    hevy_sets = p.lifts_to_hevy_sets(list(lifts), unit)
+                    sets: list[ExportSet] = [
+                        {
+                            "set_number": number,
+                            "type": s["type"],
+                            "weight": weight,
+                            "weight_kg": round(s["weight_kg"], 2),
+                            "reps": s["reps"],
+                        }
+                        for number, (weight, s) in enumerate(zip(weights, hevy_sets, strict=True), 1)
+                    ]
+                    yield {
+                        "athlete": name,
+                        "wave": wave,
+                        "week": week,
+                        "schedule_week": schedule_week,
+                        "lift": lift,
+                        "title": title,
+                        "exercise_template_id": athlete[f"{lift}_exercise_id"],  # type: ignore
+                        "unit": unit,
+                        "sets": sets,
+                    }
+                schedule_week += 1
+
+
+def write_csv(sessions: Iterable[Session], file: TextIO) -> int:
+    """Write one row per set.  Returns the number of sessions written."""
+    writer = csv.DictWriter(file, fieldnames=CSV_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for session in sessions:
+        for s in session["sets"]:
+            writer.writerow({**session, **s})
+        count += 1
+    return count
+
+
+def write_jsonl(sessions: Iterable[Session], file: TextIO) -> int:
+    """Write one JSON object per session.  Returns the number of sessions written."""
+    count = 0
+    for session in sessions:
+        file.write(json.dumps(session))
+        file.write("\n")
+        count += 1
+    return count
+
+
+def _ics_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _ics_line(line: str) -> str:
+    """Fold a content line to at most 75 octets per physical line, as RFC 5545 requires."""
+    data = line.encode()
+    if len(data) <= 75:
+        return line + "\r\n"
+    chunks = []
+    limit = 75
+    while data:
+        cut = min(limit, len(data))
+        # Don't split a multi-byte character
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        chunks.append(data[:cut].decode())
+        data = data[cut:]
+        # Continuation lines start with a space, which counts towards the limit
+        limit = 74
+    return "\r\n ".join(chunks) + "\r\n"
+
+
+def write_ics(sessions: Iterable[Session], file: TextIO, start_date: date) -> int:
+    """Write one all-day calendar event per session, scheduled from start_date.  Returns the number of events."""
+    stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%SZ")
+    file.write(_ics_line("BEGIN:VCALENDAR"))
+    file.write(_ics_line("VERSION:2.0"))
+    file.write(_ics_line("PRODID:-//juggy//juggy//EN"))
+    count = 0
+    for session in sessions:
+        day = start_date + timedelta(days=session["schedule_week"] * 7 + DAY_OFFSETS[session["lift"]])
+        unit = session["unit"]
+        description = "\n".join(f"{s['type']}: {s['weight']:g} {unit} x {s['reps']}" for s in session["sets"])
+        uid = f"{session['athlete']}-{session['wave']}-{session['week']}-{session['lift']}@juggy"
+        file.write(_ics_line("BEGIN:VEVENT"))
+        file.write(_ics_line(f"UID:{_ics_escape(uid)}"))
+        file.write(_ics_line(f"DTSTAMP:{stamp}"))
+        file.write(_ics_line(f"DTSTART;VALUE=DATE:{day.strftime('%Y%m%d')}"))
+        summary = f"{session['athlete']}: {session['title']} (Wave {session['wave']}, Week {session['week']})"
+        file.write(_ics_line(f"SUMMARY:{_ics_escape(summary)}"))
+        file.write(_ics_line(f"DESCRIPTION:{_ics_escape(description)}"))
+        file.write(_ics_line("END:VEVENT"))
+        count += 1
+    file.write(_ics_line("END:VCALENDAR"))
+    return count
+
+
+def export(sessions: Iterable[Session], format: str, file: TextIO, start_date: date | None = None) -> int:
+    """Write the sessions in the given format.  Returns the number of sessions written."""
+    if format == "csv":
+        return write_csv(sessions, file)
+    elif format == "jsonl":
+        return write_jsonl(sessions, file)
+    elif format == "ics":
+        return write_ics(sessions, file, start_date or date.today())
+    raise ValueError(f"Invalid export format: {format}")
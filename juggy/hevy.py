@@ -1,10 +1,39 @@
-from typing import Literal, NotRequired, TypedDict, cast
+import hashlib
+import threading
+from collections.abc import Callable, Hashable, Iterable, Mapping, MutableMapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Literal, NamedTuple, NotRequired, TypedDict, TypeVar, cast
 
 import requests
 from loguru import logger
+from requests.structures import CaseInsensitiveDict
+
+import juggy.log as lg
+from juggy import util as u
 
 BASE_URL = "https://api.hevyapp.com/"
 PAGE_SIZE = 10
+# The exercise template endpoint allows much larger pages than the other endpoints
+EXERCISE_TEMPLATE_PAGE_SIZE = 100
+
+# Per-page events are sampled, only one page in this many is logged
+PAGE_LOG_EVERY = 10
+
+# Key of a top set search, see find_top_sets
+K = TypeVar("K", bound=Hashable)
+
+# A session per thread, so connections to the API are pooled and reused.  Sessions aren't thread safe, and requests
+# are sent from several threads (routine fetches, job workers).
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    """The session of the current thread."""
+    session: requests.Session | None = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
 
 
 class HevySet(TypedDict):
@@ -45,6 +74,17 @@ class HevyRoutine(TypedDict):
     exercises: list[HevyExercise]
 
 
+class HevyExerciseTemplate(TypedDict):
+    """An exercise template from the Hevy exercise catalog."""
+
+    id: str
+    title: str
+    type: str
+    primary_muscle_group: str
+    secondary_muscle_groups: list[str]
+    is_custom: bool
+
+
 class HevyWorkout(TypedDict):
     """A Hevy workout."""
 
@@ -56,21 +96,51 @@ class HevyWorkout(TypedDict):
     exercises: list[HevyExercise]
 
 
+class TopSet(NamedTuple):
+    """The top (last) set of an exercise found in a workout."""
+
+    reps: int
+    workout_id: str
+    start_time: str
+
+
+class ExerciseTemplates(NamedTuple):
+    """The exercise template catalog, as downloaded."""
+
+    templates: list[HevyExerciseTemplate]
+    # ETag of the first page, to revalidate with, see exercise_templates_changed
+    etag: str | None
+
+
 def _raise_for_status(response: requests.Response) -> None:
+    # The body is capped, since errors end up in logs and the job queue
     if str(response.status_code)[0] != "2":
-        raise RuntimeError(f"Request failed with status code {response.status_code}: {response.text}")
+        raise RuntimeError(f"Request failed with status code {response.status_code}: {lg.cap(response.text)}")
 
 
-def _get_with_paging(api_key: str, url: str, object_name: str, short_circuit: int | None = None) -> list[dict]:
-    """Consume an API response with paging."""
+def _get_with_paging(
+    api_key: str,
+    url: str,
+    object_name: str,
+    short_circuit: int | None = None,
+    page_size: int = PAGE_SIZE,
+    stop: Callable[[dict], bool] | None = None,
+    first_page_headers: MutableMapping[str, str] | None = None,
+) -> list[dict]:
+    """Consume an API response with paging.
+
+    If stop is given, objects are collected up to (excluding) the first one it returns True for, and no further pages
+    are fetched.  If first_page_headers is given, the headers of the first page's response are added to it."""
     headers = {"api-key": api_key}
     page = 1
     page_count = 1
     all_objects: list[dict] = []
     while page <= page_count:
-        params = {"page": page, "pageSize": PAGE_SIZE}
-        response = requests.get(url, params=params, headers=headers)
+        params = {"page": page, "pageSize": page_size}
+        response = _session().get(url, params=params, headers=headers)
         _raise_for_status(response)
+        if first_page_headers is not None and page == 1:
+            first_page_headers.update(response.headers)
         results = response.json()
         if object_name not in results:
             return []
@@ -79,8 +149,20 @@ def _get_with_paging(api_key: str, url: str, object_name: str, short_circuit: in
             results["page_count"],
             results[object_name],
         )
-        logger.debug(f"Page {page} of {page_count} {object_name}")
+        if lg.sample("page", PAGE_LOG_EVERY):
+            logger.debug(
+                "Page {page} of {page_count} {object_name}",
+                page=page,
+                page_count=page_count,
+                object_name=object_name,
+                sampled_every=PAGE_LOG_EVERY,
+            )
         page += 1
+        if stop:
+            for i, obj in enumerate(objects):
+                if stop(obj):
+                    all_objects.extend(objects[:i])
+                    return all_objects
         all_objects.extend(objects)
         if short_circuit and len(all_objects) >= short_circuit:
             break
@@ -88,6 +170,11 @@ def _get_with_paging(api_key: str, url: str, object_name: str, short_circuit: in
     return all_objects
 
 
+def account_id(api_key: str) -> str:
+    """Identify an account by a digest of its API key, so the key itself isn't stored as an ID."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
 def get_folders(api_key: str) -> list[HevyRoutineFolder]:
     """Get all the folders from the Hevy API."""
     url = f"{BASE_URL}v1/routine_folders"
@@ -101,25 +188,171 @@ def get_workouts(api_key: str) -> list[HevyWorkout]:
     return cast(list[HevyWorkout], _get_with_paging(api_key, url, "workouts", 100))
 
 
+def get_all_workouts(api_key: str) -> list[HevyWorkout]:
+    """Get the whole workout history from the Hevy API, newest first, however many pages it takes."""
+    url = f"{BASE_URL}v1/workouts"
+    return cast(list[HevyWorkout], _get_with_paging(api_key, url, "workouts"))
+
+
+def parse_time(value: str) -> datetime:
+    """Parse a timestamp of the API, such as the start time of a workout."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def get_workouts_since(api_key: str, start_time: str | None) -> list[HevyWorkout]:
+    """Get the workouts that started at or after start_time, newest first, fetching only as many pages as needed.
+    Without a start time, only the first page (the most recent workouts) is fetched."""
+    url = f"{BASE_URL}v1/workouts"
+    if start_time is None:
+        return cast(list[HevyWorkout], _get_with_paging(api_key, url, "workouts", PAGE_SIZE))
+    since = parse_time(start_time)
+    return cast(
+        list[HevyWorkout],
+        _get_with_paging(api_key, url, "workouts", stop=lambda workout: parse_time(workout["start_time"]) < since),
+    )
+
+
+def _sets_match(sets: Sequence[HevySet], expected: Sequence[HevySet]) -> bool:
+    """Whether the sets end with the expected ones: the same weights, and the same reps except for the last set, whose
+    reps are whatever was achieved."""
+    if len(sets) < len(expected):
+        return False
+    actual = sets[len(sets) - len(expected) :]
+    for logged, wanted in zip(actual, expected, strict=True):
+        weight = logged.get("weight_kg")
+        if weight is None or not u.weights_equal(weight, wanted["weight_kg"]):
+            return False
+    return all(logged.get("reps") == wanted["reps"] for logged, wanted in zip(actual[:-1], expected[:-1], strict=True))
+
+
+def find_top_sets(  # noqa: UP047, kept importable on Python 3.11
+    workouts: Iterable[HevyWorkout], targets: Mapping[K, tuple[str, Sequence[HevySet]]]
+) -> dict[K, TopSet]:
+    """For each target, find the most recent exercise that ends with the expected sets.
+
+    Args:
+        workouts: Newest first, as returned by the API
+        targets: (exercise template ID, expected sets) keyed by anything.  With a single expected set, only the weight
+            of the top set is compared.
+
+    returns:
+        The top set of the matching exercise, keyed by the targets that were found.
+    """
+    by_exercise: dict[str, list[tuple[K, Sequence[HevySet]]]] = {}
+    for key, (exercise_id, expected) in targets.items():
+        by_exercise.setdefault(exercise_id, []).append((key, expected))
+
+    found: dict[K, TopSet] = {}
+    for workout in workouts:
+        for exercise in workout["exercises"]:
+            for key, expected in by_exercise.get(exercise["exercise_template_id"], []):
+                if key not in found and exercise["sets"] and _sets_match(exercise["sets"], expected):
+                    workout_id = workout.get("id", workout["start_time"])
+                    found[key] = TopSet(exercise["sets"][-1]["reps"], workout_id, workout["start_time"])
+        if len(found) == len(targets):
+            break
+    return found
+
+
 def get_routines(api_key: str) -> list[HevyRoutine]:
     """Get all the routines from the Hevy API."""
     url = f"{BASE_URL}v1/routines"
     return cast(list[HevyRoutine], _get_with_paging(api_key, url, "routines"))
 
 
+def get_exercise_templates(api_key: str) -> ExerciseTemplates:
+    """Get the whole exercise template catalog (built-in and custom) from the Hevy API, and its ETag."""
+    url = f"{BASE_URL}v1/exercise_templates"
+    # Header names are case insensitive
+    headers: CaseInsensitiveDict[str] = CaseInsensitiveDict()
+    templates = _get_with_paging(
+        api_key, url, "exercise_templates", page_size=EXERCISE_TEMPLATE_PAGE_SIZE, first_page_headers=headers
+    )
+    return ExerciseTemplates(cast(list[HevyExerciseTemplate], templates), headers.get("ETag"))
+
+
+def exercise_templates_changed(api_key: str, etag: str | None) -> tuple[bool, str | None]:
+    """Check whether the exercise template catalog changed since the given ETag.
+
+    Only the first page is requested, conditionally, so changes to later pages only show up if they shift what the
+    first page holds (or its page count).  Returns whether the catalog changed and the current ETag, which is None if
+    the API does not send one (in which case the catalog is always reported as changed)."""
+    url = f"{BASE_URL}v1/exercise_templates"
+    headers = {"api-key": api_key}
+    if etag:
+        headers["If-None-Match"] = etag
+    params = {"page": 1, "pageSize": EXERCISE_TEMPLATE_PAGE_SIZE}
+    response = _session().get(url, params=params, headers=headers)
+    if response.status_code == 304:
+        return False, etag
+    _raise_for_status(response)
+    new_etag = response.headers.get("ETag")
+    return new_etag is None or new_etag != etag, new_etag
+
+
+def get_routine(api_key: str, routine_id: int | str) -> HevyRoutine | None:
+    """Get a single routine by id from the Hevy API, or None if there is no such routine."""
+    url = f"{BASE_URL}v1/routines/{routine_id}"
+    headers = {"api-key": api_key}
+    response = _session().get(url, headers=headers)
+    if response.status_code == 404:
+        return None
+    _raise_for_status(response)
+    result = response.json()
+    return cast(HevyRoutine, result.get("routine", result))
+
+
+def find_routine_by_id(routine_id: int | str, routines: list[HevyRoutine]) -> HevyRoutine | None:
+    """Find a routine by id.  Ids are compared as strings, since they come from both the API and the command line."""
+    return next((r for r in routines if str(r["id"]) == str(routine_id)), None)
+
+
+def get_routines_by_id(api_key: str, routine_ids: list[str], max_workers: int = 4) -> dict[str, HevyRoutine | None]:
+    """Get several routines by id, concurrently.
+
+    Each routine is fetched directly.  Any that can't be (missing, or the request failed) is looked up in the full
+    routine list instead, which is fetched at most once for all of them."""
+
+    def fetch(routine_id: str) -> HevyRoutine | None:
+        try:
+            return get_routine(api_key, routine_id)
+        except (RuntimeError, requests.RequestException) as e:
+            logger.warning("Could not fetch routine {routine_id}", routine_id=routine_id, error=str(e))
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = dict(zip(routine_ids, pool.map(fetch, routine_ids), strict=True))
+
+    missing = [routine_id for routine_id, routine in results.items() if routine is None]
+    if missing:
+        logger.info("Falling back to the routine list for {count} routine(s)", count=len(missing))
+        all_routines = get_routines(api_key)
+        for routine_id in missing:
+            results[routine_id] = find_routine_by_id(routine_id, all_routines)
+    return results
+
+
+def tidy_exercises(exercises: list[HevyExercise]) -> list[HevyExercise]:
+    """Copy exercises returned by the API without the index and title fields, making them suitable for PUTs to the
+    Hevy API.  The originals are not modified."""
+    tidied = []
+    for exercise in exercises:
+        copy = cast(HevyExercise, {k: v for k, v in exercise.items() if k not in ("index", "title")})
+        copy["sets"] = [cast(HevySet, {k: v for k, v in s.items() if k != "index"}) for s in exercise["sets"]]
+        tidied.append(copy)
+    return tidied
+
+
 def get_exercises_from_routine(routine_id: str | None, all_routines: list[HevyRoutine]) -> list[HevyExercise] | None:
     """Search for and return the HevyExercises from a specific routine identified by routine_id.
     The results are tidied up to remove the index and title fields, making them suitable for PUTs to the Hevy API."""
-    routine = next((r for r in all_routines if r["id"] == routine_id), None)
-    logger.debug(f"Routine: {routine}")
+    if routine_id is None:
+        return None
+    routine = find_routine_by_id(routine_id, all_routines)
+    logger.debug("Routine {routine_id}", routine_id=routine_id, routine=routine)
     if routine:
-        exercises = routine["exercises"]
-        for exercise in exercises:
-            del exercise["index"]
-            del exercise["title"]
-            for set in exercise["sets"]:
-                del set["index"]
-        logger.debug(f"Exercises: {exercises}")
+        exercises = tidy_exercises(routine["exercises"])
+        logger.debug("Exercises of routine {routine_id}", routine_id=routine_id, exercises=exercises)
         return exercises
     else:
         return None
@@ -131,50 +364,30 @@ def create_folder(api_key: str, title: str) -> HevyRoutineFolder:
     headers = {"api-key": api_key}
     data = {"routine_folder": {"title": title}}
 
-    response = requests.post(url, headers=headers, json=data)
+    response = _session().post(url, headers=headers, json=data)
     _raise_for_status(response)
-    logger.debug(f"Got response: {response}")
+    logger.debug("Created folder {title}: {status_code}", title=title, status_code=response.status_code)
     return cast(HevyRoutineFolder, response.json()["routine_folder"])
 
 
-def create_or_update_routine(
-    api_key: str,
-    existing_routines: list[HevyRoutine],
-    title: str,
-    folder_id: int,
-    exercises: list[HevyExercise],
-    accessories: list[HevyExercise] | None = None,
-) -> HevyRoutine:
-    """Create or update a routine in the Hevy API."""
+def find_routine(routines: list[HevyRoutine], title: str, folder_id: int) -> HevyRoutine | None:
+    """Find the routine with the given title in the given folder."""
+    return next((r for r in routines if (r["title"] == title and r["folder_id"] == folder_id)), None)
+
+
+def create_routine(api_key: str, body: bytes) -> HevyRoutine:
+    """Create a routine in the Hevy API from a pre-serialized JSON body."""
     url = f"{BASE_URL}v1/routines"
+    headers = {"api-key": api_key, "Content-Type": "application/json"}
+    response = _session().post(url, headers=headers, data=body)
+    _raise_for_status(response)
+    return cast(HevyRoutine, response.json())
 
-    headers = {"api-key": api_key}
 
-    if accessories:
-        exercises.extend(accessories)
-    else:
-        logger.warning(f"No accessories provided for routine {title}")
-
-    data = {
-        "routine": {
-            "title": title,
-            "folder_id": folder_id,
-            "exercises": exercises,
-        }
-    }
-
-    existing_routine = next(
-        (r for r in existing_routines if (r["title"] == title and r["folder_id"] == folder_id)), None
-    )
-    if existing_routine:
-        routine_id = existing_routine["id"]
-        del data["routine"]["folder_id"]
-        logger.info(f"Updating routine {title} with id {routine_id}")
-        url = f"{url}/{routine_id}"
-        response = requests.put(url, headers=headers, json=data)
-        _raise_for_status(response)
-    else:
-        logger.info(f"Creating routine {title} in folder {folder_id}")
-        response = requests.post(url, headers=headers, json=data)
-        _raise_for_status(response)
+def update_routine(api_key: str, routine_id: int, body: bytes) -> HevyRoutine:
+    """Update a routine in the Hevy API from a pre-serialized JSON body."""
+    url = f"{BASE_URL}v1/routines/{routine_id}"
+    headers = {"api-key": api_key, "Content-Type": "application/json"}
+    response = _session().put(url, headers=headers, data=body)
+    _raise_for_status(response)
     return cast(HevyRoutine, response.json())
@@ -0,0 +1,300 @@
+"""A persistent, SQLite backed job queue for roster-wide runs.
+
+Each athlete/wave/week is a job with a status.  A pool of workers drains the queue; failed jobs are retried up to a
+limit, and jobs that completed are skipped when a run is restarted.  A job is only claimed if no other job of the same
+account is running, so two workers (even in different processes) never write to the same account at once.
+
+Jobs only hold the athlete's name and a digest of their API key, never the config itself (or the key).  The handler
+looks the athlete up in the roster being worked, so changes made since the week was queued, such as approved training
+maxes, are picked up.
+
+While a job runs, its process refreshes the job's updated_at every HEARTBEAT_SECONDS.  A running job that hasn't been
+refreshed for STALE_SECONDS belongs to a process that died, and workers looking for work make it pending again."""
+
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal, TypedDict, cast
+
+from loguru import logger
+
+import juggy.config as c
+import juggy.hevy as h
+
+QUEUE_FILE = "juggy-jobs.db"
+MAX_ATTEMPTS = 3
+# How long a worker waits before looking again when every remaining job is blocked by a running one
+POLL_SECONDS = 0.5
+# How often the updated_at of running jobs is refreshed
+HEARTBEAT_SECONDS = 15
+# A running job not refreshed for this long is assumed to belong to a worker that died, and is made available again
+STALE_SECONDS = 4 * HEARTBEAT_SECONDS
+
+Status = Literal["pending", "running", "done", "failed"]
+
+
+class InvalidJobError(ValueError):
+    """Raised by a handler for a job that can't succeed as queued (e.g. a bad config), so it isn't retried."""
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    athlete TEXT NOT NULL,
+    account TEXT NOT NULL,
+    wave INTEGER NOT NULL,
+    week INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    UNIQUE (athlete, wave, week)
+)
+"""
+
+
+class Job(TypedDict):
+    """A queued athlete/week."""
+
+    id: int
+    athlete: str
+    # Digest of the API key, so the key itself isn't used as a lock name
+    account: str
+    wave: int
+    week: int
+    status: Status
+    attempts: int
+    error: str | None
+
+
+def connect(filename: str = QUEUE_FILE) -> sqlite3.Connection:
+    """Open (and create if needed) the queue.  Connections can't be shared between threads."""
+    conn = sqlite3.connect(filename, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def account_id(config: c.Config) -> str:
+    """Identify the account of an athlete, see hevy.account_id."""
+    return h.account_id(config["api_key"])
+
+
+def _to_job(row: sqlite3.Row) -> Job:
+    return cast(Job, dict(row))
+
+
+def enqueue(conn: sqlite3.Connection, athletes: Iterable[c.Config], wave: int, week: int) -> int:
+    """Add a job per athlete for the given week.  Jobs that already exist are left alone, whatever their status.
+
+    Jobs are keyed by athlete name, so a name already queued for the week with another account is an error, rather than
+    silently skipping that athlete.  Nothing is queued then.
+
+    returns:
+        The number of jobs added.
+    """
+    now = time.time()
+    added = 0
+    conn.execute("BEGIN")
+    try:
+        for athlete in athletes:
+            name, account = c.athlete_name(athlete), account_id(athlete)
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (athlete, account, wave, week, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (name, account, wave, week, now),
+            )
+            if cursor.rowcount == 0:
+                row = conn.execute(
+                    "SELECT account FROM jobs WHERE athlete = ? AND wave = ? AND week = ?", (name, wave, week)
+                ).fetchone()
+                if row["account"] != account:
+                    raise ValueError(f"Athlete name {name!r} is already queued for another account")
+            added += cursor.rowcount
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return added
+
+
+def claim(conn: sqlite3.Connection, max_attempts: int = MAX_ATTEMPTS) -> Job | None:
+    """Atomically take the next runnable job and mark it running, or return None if there is none right now.
+
+    Runnable jobs are pending ones, and failed ones that have attempts left, whose account has no running job."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE (status = 'pending' OR (status = 'failed' AND attempts < ?)) "
+            "AND account NOT IN (SELECT account FROM jobs WHERE status = 'running') ORDER BY id LIMIT 1",
+            (max_attempts,),
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+            (time.time(), row["id"]),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    job = _to_job(row)
+    job["status"] = "running"
+    job["attempts"] += 1
+    return job
+
+
+def finish(conn: sqlite3.Connection, job_id: int, error: str | None = None) -> None:
+    """Mark a job done, or failed with the given error."""
+    status = "failed" if error else "done"
+    conn.execute(
+        "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?", (status, error, time.time(), job_id)
+    )
+
+
+def abandon(conn: sqlite3.Connection, job_id: int, error: str, max_attempts: int = MAX_ATTEMPTS) -> None:
+    """Mark a job failed for good, with the given error.  It isn't claimed again, whatever attempts it has left."""
+    conn.execute(
+        "UPDATE jobs SET status = 'failed', error = ?, attempts = MAX(attempts, ?), updated_at = ? WHERE id = ?",
+        (error, max_attempts, time.time(), job_id),
+    )
+
+
+def heartbeat(conn: sqlite3.Connection, job_ids: Iterable[int]) -> None:
+    """Refresh the updated_at of running jobs, so they aren't taken for the jobs of a dead worker."""
+    now = time.time()
+    conn.executemany(
+        "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running'", [(now, job_id) for job_id in job_ids]
+    )
+
+
+class _Heartbeat:
+    """Refreshes the jobs running in this process from a background thread, until stopped."""
+
+    def __init__(self, filename: str) -> None:
+        self._filename = filename
+        self._running: set[int] = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+        self._thread.start()
+
+    def add(self, job_id: int) -> None:
+        with self._lock:
+            self._running.add(job_id)
+
+    def discard(self, job_id: int) -> None:
+        with self._lock:
+            self._running.discard(job_id)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _beat(self) -> None:
+        conn = connect(self._filename)
+        try:
+            while not self._stopped.wait(HEARTBEAT_SECONDS):
+                with self._lock:
+                    job_ids = list(self._running)
+                heartbeat(conn, job_ids)
+        finally:
+            conn.close()
+
+
+def recover(conn: sqlite3.Connection, stale_seconds: float = STALE_SECONDS) -> int:
+    """Make jobs left running by a worker that died available again.  Returns the number of jobs recovered."""
+    cursor = conn.execute(
+        "UPDATE jobs SET status = 'pending' WHERE status = 'running' AND updated_at < ?",
+        (time.time() - stale_seconds,),
+    )
+    return cursor.rowcount
+
+
+def has_work(conn: sqlite3.Connection, max_attempts: int = MAX_ATTEMPTS) -> bool:
+    """Whether any job is still running or could still be run."""
+    row = conn.execute(
+        "SELECT 1 FROM jobs WHERE status IN ('pending', 'running') OR (status = 'failed' AND attempts < ?) LIMIT 1",
+        (max_attempts,),
+    ).fetchone()
+    return row is not None
+
+
+def status(conn: sqlite3.Connection) -> dict[str, int]:
+    """Count the jobs by status."""
+    rows = conn.execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status")
+    return {row["status"]: row["count"] for row in rows}
+
+
+def _worker(
+    filename: str, handler: Callable[[Job], None], max_attempts: int, stale_seconds: float, beat: _Heartbeat
+) -> int:
+    """Run jobs until the queue is drained.  Returns the number of jobs this worker completed."""
+    conn = connect(filename)
+    done = 0
+    try:
+        while True:
+            job = claim(conn, max_attempts)
+            if job is None:
+                # Jobs left running by a worker that died would otherwise keep the queue from ever draining
+                recovered = recover(conn, stale_seconds)
+                if recovered:
+                    logger.warning("Recovered {count} job(s) left running by a dead worker", count=recovered)
+                    continue
+                if not has_work(conn, max_attempts):
+                    return done
+                # The remaining jobs belong to accounts another worker is busy with
+                time.sleep(POLL_SECONDS)
+                continue
+            beat.add(job["id"])
+            fields = {"athlete": job["athlete"], "wave": job["wave"], "week": job["week"]}
+            logger.info(
+                "Running {athlete} wave {wave} week {week} (attempt {attempt})", attempt=job["attempts"], **fields
+            )
+            try:
+                handler(job)
+            except InvalidJobError as e:
+                logger.error("Failed {athlete} wave {wave} week {week}, not retrying", error=str(e), **fields)
+                abandon(conn, job["id"], str(e), max_attempts)
+            except Exception as e:
+                logger.error("Failed {athlete} wave {wave} week {week}", error=str(e), **fields)
+                finish(conn, job["id"], str(e) or type(e).__name__)
+            else:
+                finish(conn, job["id"])
+                done += 1
+            finally:
+                beat.discard(job["id"])
+    finally:
+        conn.close()
+
+
+def work(
+    handler: Callable[[Job], None],
+    filename: str = QUEUE_FILE,
+    workers: int = 4,
+    max_attempts: int = MAX_ATTEMPTS,
+    stale_seconds: float = STALE_SECONDS,
+) -> dict[str, int]:
+    """Drain the queue with a pool of workers, each calling handler for the jobs it claims.
+
+    returns:
+        The job counts by status once the queue is drained.
+    """
+    conn = connect(filename)
+    try:
+        beat = _Heartbeat(filename)
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(_worker, filename, handler, max_attempts, stale_seconds, beat) for _ in range(workers)
+                ]
+                completed = sum(f.result() for f in futures)
+        finally:
+            beat.stop()
+        logger.info("Completed {count} job(s)", count=completed)
+        return status(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,90 @@
+"""Loading rules: which weights can actually be put on the bar in a given gym, and how to snap to them."""
+
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Literal, NamedTuple, NotRequired, TypedDict
+
+Unit = Literal["lb", "kg"]
+Rounding = Literal["floor", "nearest", "ceil"]
+
+# Bar weight and default first warmup weights, per unit
+DEFAULT_BAR = {"lb": 45.0, "kg": 20.0}
+DEFAULT_DEADLIFT_WARMUP_START = {"lb": 65.0, "kg": 30.0}
+
+
+class LoadingRules(TypedDict):
+    """The equipment of a gym, as configured by the user."""
+
+    # The unit training maxes are expressed in and plates are labeled in
+    unit: Unit
+    # Each entry is one *pair* of plates, e.g. [45, 45, 25, 10, 5, 2.5]
+    plates: list[float]
+    bar: NotRequired[float]
+    rounding: NotRequired[Rounding]
+    warmup_start: NotRequired[float]
+    deadlift_warmup_start: NotRequired[float]
+
+
+class LoadTable(NamedTuple):
+    """All loads achievable with a gym's equipment, precomputed and sorted.  Hashable, so it can be a cache key."""
+
+    unit: Unit
+    loads: tuple[float, ...]
+    rounding: Rounding
+    warmup_start: float
+    deadlift_warmup_start: float
+
+
+@lru_cache(maxsize=64)
+def _build_table(
+    unit: Unit,
+    bar: float,
+    plates: tuple[float, ...],
+    rounding: Rounding,
+    warmup_start: float,
+    deadlift_warmup_start: float,
+) -> LoadTable:
+    sums = {0.0}
+    for plate in plates:
+        # Rounded to keep e.g. 1.25 + 2.5 from producing float noise that defeats deduplication
+        sums |= {round(s + plate, 4) for s in sums}
+    loads = tuple(sorted(round(bar + 2 * s, 4) for s in sums))
+    return LoadTable(unit, loads, rounding, warmup_start, deadlift_warmup_start)
+
+
+def build_table(rules: LoadingRules) -> LoadTable:
+    """Precompute the load table for a gym.  Tables are cached, so this is cheap to call repeatedly."""
+    unit = rules["unit"]
+    if unit not in DEFAULT_BAR:
+        raise ValueError(f"Invalid unit: {unit}")
+    rounding = rules.get("rounding", "ceil")
+    if rounding not in ("floor", "nearest", "ceil"):
+        raise ValueError(f"Invalid rounding mode: {rounding}")
+    if any(plate <= 0 for plate in rules["plates"]):
+        raise ValueError("Plates must weigh more than 0")
+    bar = rules.get("bar", DEFAULT_BAR[unit])
+    return _build_table(
+        unit,
+        bar,
+        tuple(sorted(rules["plates"])),
+        rounding,
+        rules.get("warmup_start", bar),
+        rules.get("deadlift_warmup_start", DEFAULT_DEADLIFT_WARMUP_START[unit]),
+    )
+
+
+def snap_weight(table: LoadTable, weight: float) -> float:
+    """Snap a weight to an achievable load according to the table's rounding mode.
+    Weights outside the achievable range are clamped to the lightest or heaviest load."""
+    loads = table.loads
+    if table.rounding == "floor":
+        i = bisect_right(loads, weight)
+        return loads[max(i - 1, 0)]
+    i = bisect_left(loads, weight)
+    if i == len(loads):
+        return loads[-1]
+    if table.rounding == "ceil" or i == 0 or loads[i] == weight:
+        return loads[i]
+    # nearest, ties go up
+    below, above = loads[i - 1], loads[i]
+    return below if weight - below < above - weight else above
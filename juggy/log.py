@@ -0,0 +1,116 @@
+"""Structured logging on top of loguru: text or JSON records, with secrets redacted and large fields capped.
+
+Log calls keep data out of the message and pass it as keyword arguments instead, e.g.
+
+    logger.debug("Routine {routine_id}", routine_id=routine_id, routine=routine)
+
+Only short, known values (IDs, names, counts) belong in the message template: loguru formats the message before the
+record is patched, so whatever goes in the message is neither redacted nor capped.  Errors and payloads are fields.
+
+loguru drops a record before formatting anything if no handler accepts its level, so this costs next to nothing when
+debug is off, unlike an f-string.  The keyword arguments become fields of the record.  When a record is emitted, its
+fields are redacted (api_key) and capped at MAX_FIELD_CHARS, so whole routines or responses can be attached safely."""
+
+import itertools
+import json
+import sys
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any, Literal, TextIO
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from loguru import Message, Record
+
+LogFormat = Literal["text", "json"]
+FORMATS = ["text", "json"]
+# loguru's built-in levels
+LEVELS = ["TRACE", "DEBUG", "INFO", "SUCCESS", "WARNING", "ERROR", "CRITICAL"]
+DEFAULT_LEVEL = "INFO"
+# Fields longer than this (as JSON) are truncated
+MAX_FIELD_CHARS = 1000
+REDACTED_KEYS = frozenset({"api_key", "api-key"})
+REDACTED = "[redacted]"
+
+_TEXT_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+)
+
+_counters: dict[str, "itertools.count[int]"] = {}
+
+
+def redact(value: Any) -> Any:
+    """Copy a value with the values of secret keys, at any depth, replaced."""
+    if isinstance(value, dict):
+        return {k: REDACTED if k in REDACTED_KEYS else redact(v) for k, v in value.items()}
+    if isinstance(value, list | tuple):
+        return [redact(v) for v in value]
+    return value
+
+
+def cap(value: Any, limit: int = MAX_FIELD_CHARS) -> Any:
+    """Return a value as is if it's short enough as JSON, otherwise its JSON truncated to limit characters."""
+    if value is None or isinstance(value, bool | int | float):
+        return value
+    text = value if isinstance(value, str) else json.dumps(value, default=str, separators=(",", ":"))
+    if len(text) <= limit:
+        return value
+    return f"{text[:limit]}... ({len(text) - limit} more characters)"
+
+
+def sample(event: str, every: int) -> bool:
+    """Whether to log this occurrence of a high-volume event: the first one, then one in every."""
+    try:
+        counter = _counters[event]
+    except KeyError:
+        counter = _counters.setdefault(event, itertools.count())
+    return next(counter) % every == 0
+
+
+def _patch(record: "Record") -> None:
+    extra = record["extra"]
+    for key, value in extra.items():
+        extra[key] = REDACTED if key in REDACTED_KEYS else cap(redact(value))
+
+
+def _text_format(record: "Record") -> str:
+    fields = " | {extra}" if record["extra"] else ""
+    return f"{_TEXT_FORMAT}{fields}\n{{exception}}"
+
+
+def _json_sink(stream: TextIO) -> Callable[["Message"], None]:
+    def sink(message: "Message") -> None:
+        record = message.record
+        entry = {
+            "time": record["time"].isoformat(),
+            "level": record["level"].name,
+            "logger": record["name"],
+            "function": record["function"],
+            "line": record["line"],
+            "message": record["message"],
+            **record["extra"],
+        }
+        if record["exception"] and record["exception"].type:
+            entry["exception"] = f"{record['exception'].type.__name__}: {record['exception'].value}"
+        stream.write(json.dumps(entry, default=str) + "\n")
+
+    return sink
+
+
+def setup(level: str = DEFAULT_LEVEL, format: LogFormat = "text", stream: TextIO = sys.stderr) -> None:
+    """Replace loguru's default handler (everything from DEBUG up, as text) with one for the given level and format."""
+    logger.remove()
+    logger.configure(patcher=_patch)
+    if format == "json":
+        logger.add(_json_sink(stream), level=level)
+    else:
+        logger.add(stream, level=level, format=_text_format)
+
+
+def reset() -> None:
+    """Undo setup: loguru's default handler, and records left as logged."""
+    logger.remove()
+    # configure(patcher=None) leaves the current patcher in place, so it's replaced with one that does nothing
+    logger.configure(patcher=lambda record: None)
+    logger.add(sys.stderr)
@@ -1,135 +1,188 @@
 """Main application logic and entry point."""
+
 import argparse
+import json
 import shutil
+import sqlite3
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterable
+from contextlib import closing
+from datetime import date
 from typing import cast
 
 from loguru import logger
 
 import juggy.algo as a
+import juggy.archive as ar
+import juggy.catalog as cat
 import juggy.config as c
+import juggy.export as ex
 import juggy.hevy as h
+import juggy.jobs as j
+import juggy.loading as ld
+import juggy.log as lg
+import juggy.payload as p
+import juggy.plan as pl
+import juggy.watch as w
 from juggy import util as u
 
-ROUND_WEIGHT_PRECISION = 5
+ROUND_WEIGHT_PRECISION = p.ROUND_WEIGHT_PRECISION
 ONE_REP_MAX_THRESHOLD = 0.95
 BENCH_INCREMENT = 2.5
 OHP_INCREMENT = 2.5
 SQUAT_INCREMENT = 5
 DEADLIFT_INCREMENT = 5
+INCREMENTS = {"squat": SQUAT_INCREMENT, "bench": BENCH_INCREMENT, "deadlift": DEADLIFT_INCREMENT, "ohp": OHP_INCREMENT}
+# Moved to payload, next to the set generation that uses it, and still importable from here
+lifts_to_hevy_sets = p.lifts_to_hevy_sets
+# The reps expected of the week 3 top set of each wave
+WEEK3_EXPECTED_REPS = [10, 8, 5, 3]
 
 
-def lifts_to_hevy_sets(lifts: list[tuple[float | int, int] | None]) -> list[h.HevySet]:
-    """Convert a list of lifts to a list of sets for the Hevy API."""
-    exercises = []
-    type = "warmup"
-    for lift in lifts:
-        if lift is None:
-            type = "normal"
-            continue
-        weight_lbs, reps = lift
-        weight_kg = u.lbs_to_kgs(weight_lbs)
-        exercises.append({"type": type, "weight_kg": weight_kg, "reps": reps})
-    return cast(list[h.HevySet], exercises)
-
-
-def setup_routines(
+def plan_routines(
     api_key: str,
     config: c.Config,
     squats: list[h.HevyExercise],
     bench: list[h.HevyExercise],
     deads: list[h.HevyExercise],
     ohp: list[h.HevyExercise],
-) -> None:
+) -> list[pl.Operation]:
     """
-    Set up the routines in the Hevy API.
+    Plan the routines in the Hevy API, without writing anything.
 
-    This will ensure we have 4 routines in a folder named "Juggy":
+    The plan ensures we have 4 routines in a folder named "Juggy":
     - Squat Day
     - Bench Day
     - Deadlift Day
     - OHP Day
 
-    The routines and folder will be created if they don't exist, or updated if they do.
+    The routines and folder will be created if they don't exist, or updated if they do and differ.
     """
     folders = h.get_folders(api_key)
+    routines = h.get_routines(api_key)
+
+    wanted = [
+        ("Squat Day", p.merge_accessories("Squat Day", squats, config.get("squat_accessories"))),
+        ("Bench Day", p.merge_accessories("Bench Day", bench, config.get("bench_accessories"))),
+        ("Deadlift Day", p.merge_accessories("Deadlift Day", deads, config.get("deadlift_accessories"))),
+        ("OHP Day", p.merge_accessories("OHP Day", ohp, config.get("ohp_accessories"))),
+    ]
+    plan = pl.build_plan(folders, routines, config["folder"], wanted)
+    logger.info("Planned operations: {operations}", operations=pl.summarize(plan))
+    return plan
+
 
-    folder_name = config["folder"]
-    for folder in folders:
-        if folder["title"] == folder_name:
-            folder_id = folder["id"]
-            logger.info(f"Found {folder_name} folder with id {folder_id}")
-            break
+def setup_routines(
+    api_key: str,
+    config: c.Config,
+    squats: list[h.HevyExercise],
+    bench: list[h.HevyExercise],
+    deads: list[h.HevyExercise],
+    ohp: list[h.HevyExercise],
+) -> None:
+    """Set up the routines in the Hevy API, see plan_routines."""
+    pl.execute_plan(api_key, plan_routines(api_key, config, squats, bench, deads, ohp))
+
+
+def _validate_exercise_ids(api_key: str, config: c.Config, catalog_file: str) -> None:
+    """Fail before any writes if the config references exercise IDs that don't exist in the catalog."""
+    index = cat.build_index(cat.sync_catalog(api_key, catalog_file))
+    problems = cat.validate_config(config, index)
+    if problems:
+        for problem in problems:
+            logger.error(problem)
+        raise RuntimeError(f"Config has {len(problems)} invalid exercise ID(s), see above.")
+
+
+def _lookup_exercises(api_key: str, catalog_file: str, name: str | None, refresh: bool) -> None:
+    """Print the exercise templates matching name (as an ID or part of a title), or the whole catalog."""
+    index = cat.build_index(cat.sync_catalog(api_key, catalog_file, force=refresh))
+    if name:
+        template = cat.find_by_id(index, name)
+        templates = [template] if template else cat.search(index, name)
     else:
-        logger.info(f"{folder_name} folder does not exist, creating it")
-        response = h.create_folder(api_key, folder_name)
-        logger.debug(f"Got response: {response}")
-        folder_id = response["id"]
-        logger.info(f"Created {folder_name} folder with id {folder_id}")
+        templates = list(index["by_id"].values())
+    for template in templates:
+        # Custom templates may share their title with a built-in one
+        custom = " (custom)" if template["is_custom"] else ""
+        print(f"{template['id']}\t{template['title']}{custom}")
+    if not templates:
+        print(f"No exercises found matching {name}")
 
-    routines = h.get_routines(api_key)
 
-    squat_accessories = config["squat_accessories"] if "squat_accessories" in config else None
-    bench_accessories = config["bench_accessories"] if "bench_accessories" in config else None
-    deadlift_accessories = config["deadlift_accessories"] if "deadlift_accessories" in config else None
-    ohp_accessories = config["ohp_accessories"] if "ohp_accessories" in config else None
+def _to_kgs(weight: float, table: ld.LoadTable | None) -> float:
+    """Convert a weight in the table's unit (lbs without a table) to kgs."""
+    return weight if table and table.unit == "kg" else u.lbs_to_kgs(weight)
+
 
-    h.create_or_update_routine(api_key, routines, "Squat Day", folder_id, squats, squat_accessories)
-    h.create_or_update_routine(api_key, routines, "Bench Day", folder_id, bench, bench_accessories)
-    h.create_or_update_routine(api_key, routines, "Deadlift Day", folder_id, deads, deadlift_accessories)
-    h.create_or_update_routine(api_key, routines, "OHP Day", folder_id, ohp, ohp_accessories)
+def _increment(increment_lbs: float, table: ld.LoadTable | None) -> float:
+    """Express a training max increment in the table's unit."""
+    return u.lbs_to_kgs(increment_lbs) if table and table.unit == "kg" else increment_lbs
 
 
-def _setup_week(api_key: str, config: c.Config, wave: int, week: int) -> None:
-    """Setup a week in the Hevy API.
+def _plan_week(
+    api_key: str, config: c.Config, wave: int, week: int, table: ld.LoadTable | None = None
+) -> list[pl.Operation]:
+    """Plan the setup of a week in the Hevy API.
 
     Args:
         api_key: The API key for the Hevy account.
         wave: The wave of the program (1-4)
         week: The week number of the program (1-4). Every 4th week is a deload week
+        table: The load table of the gym, if any
     """
     if wave < 0 or wave > 4:
         raise ValueError(f"Invalid wave number: {wave}")
     if week < 0 or week > 4:
         raise ValueError(f"Invalid week number: {week}")
 
-    protocol = a.TEMPLATE[wave - 1][week - 1]
-    squats = a.generate_lifts(protocol, config["squat_tm"], ROUND_WEIGHT_PRECISION, False)
-    bench = a.generate_lifts(protocol, config["bench_tm"], ROUND_WEIGHT_PRECISION, False)
-    deads = a.generate_lifts(protocol, config["deadlift_tm"], ROUND_WEIGHT_PRECISION, True)
-    ohp = a.generate_lifts(protocol, config["ohp_tm"], ROUND_WEIGHT_PRECISION, False)
-
+    protocol = tuple(a.TEMPLATE[wave - 1][week - 1])
     notes = f"Wave {wave}, Week {week}"
+    precision = ROUND_WEIGHT_PRECISION
 
-    setup_routines(
-        api_key,
-        config,
-        [{"exercise_template_id": config["squat_exercise_id"], "sets": lifts_to_hevy_sets(squats), "notes": notes}],
-        [{"exercise_template_id": config["bench_exercise_id"], "sets": lifts_to_hevy_sets(bench), "notes": notes}],
-        [{"exercise_template_id": config["deadlift_exercise_id"], "sets": lifts_to_hevy_sets(deads), "notes": notes}],
-        [{"exercise_template_id": config["ohp_exercise_id"], "sets": lifts_to_hevy_sets(ohp), "notes": notes}],
+    squats = p.build_exercise(config["squat_exercise_id"], protocol, config["squat_tm"], precision, False, notes, table)
+    bench = p.build_exercise(config["bench_exercise_id"], protocol, config["bench_tm"], precision, False, notes, table)
+    deads = p.build_exercise(
+        config["deadlift_exercise_id"], protocol, config["deadlift_tm"], precision, True, notes, table
     )
+    ohp = p.build_exercise(config["ohp_exercise_id"], protocol, config["ohp_tm"], precision, False, notes, table)
 
+    return plan_routines(api_key, config, [squats], [bench], [deads], [ohp])
 
-def _compute_top_set_weight_kg(multiplier: float, training_max: float) -> float:
-    """Compute the expected weight of the top set based on the multiplier and training max."""
-    return u.lbs_to_kgs(a.round_weight(training_max * multiplier, ROUND_WEIGHT_PRECISION))
 
+def _setup_week(api_key: str, config: c.Config, wave: int, week: int, table: ld.LoadTable | None = None) -> None:
+    """Setup a week in the Hevy API.  See _plan_week for the arguments."""
+    pl.execute_plan(api_key, _plan_week(api_key, config, wave, week, table))
 
-def _weights_equal(weight1: float, weight2: float) -> bool:
-    """Compare two weights, allowing for small floating point differences."""
-    return abs(weight1 - weight2) < 0.01
+
+def _dry_run(api_key: str, config: c.Config, wave: int, week: int, table: ld.LoadTable | None, output: str) -> None:
+    """Print the plan for a week (or save it, to be applied later), without writing anything."""
+    saved: pl.SavedPlan = {
+        "account": h.account_id(api_key),
+        "operations": _plan_week(api_key, config, wave, week, table),
+    }
+    if output == "-":
+        print(json.dumps(saved, indent=4))
+    else:
+        pl.save_plan(saved, output)
+        logger.info("Saved plan to {output}", output=output)
+
+
+def _compute_top_set_weight_kg(multiplier: float, training_max: float, table: ld.LoadTable | None = None) -> float:
+    """Compute the expected weight of the top set based on the multiplier and training max."""
+    return _to_kgs(a.load_weight(training_max * multiplier, ROUND_WEIGHT_PRECISION, table), table)
 
 
-def _get_exercise_top_set_reps(exercise: h.HevyExercise, exercise_id: str, top_set_weight_kgs: float) -> int | None:
-    """Search within an exercise for a top set that matches the expected weight."""
-    if exercise["exercise_template_id"] == exercise_id:
-        sets = exercise["sets"]
-        if _weights_equal(sets[-1]["weight_kg"], top_set_weight_kgs):
-            return sets[-1]["reps"]
-    return None
+def _top_set(multiplier: float, training_max: float, table: ld.LoadTable | None = None) -> h.HevySet:
+    """The expected top set, for matching against logged workouts.  Its reps are not compared."""
+    return {"type": "normal", "weight_kg": _compute_top_set_weight_kg(multiplier, training_max, table), "reps": 0}
 
 
-def find_week3_top_sets_reps(config: c.Config, multiplier: float, workouts: list[h.HevyWorkout]) -> dict[str, int]:
+def find_week3_top_sets_reps(
+    config: c.Config, multiplier: float, workouts: list[h.HevyWorkout], table: ld.LoadTable | None = None
+) -> dict[str, int]:
     """Finds the top set for each main lift in wave 3 by searching backwards in training history.
     The way we find that is to search for a top set that matches algo.TEMPLATE[wave][3][last_element]. This is
     obviously not foolproof because if the user has changed the protocol, we won't find it.
@@ -137,52 +190,56 @@ def find_week3_top_sets_reps(config: c.Config, multiplier: float, workouts: list
     returns:
         A dictionary with keys "squat", "bench", "deadlift", "ohp" and values are the reps of the top set
     """
-    squat_exercise_id = config["squat_exercise_id"]
-    bench_exercise_id = config["bench_exercise_id"]
-    deadlift_exercise_id = config["deadlift_exercise_id"]
-    ohp_exercise_id = config["ohp_exercise_id"]
-
-    squat_top_set_weight_kgs = _compute_top_set_weight_kg(multiplier, config["squat_tm"])
-    bench_top_set_weight_kgs = _compute_top_set_weight_kg(multiplier, config["bench_tm"])
-    deadlift_top_set_weight_kgs = _compute_top_set_weight_kg(multiplier, config["deadlift_tm"])
-    ohp_top_set_weight_kgs = _compute_top_set_weight_kg(multiplier, config["ohp_tm"])
-
-    logger.debug(f"Looking for Squat top set with weight {squat_top_set_weight_kgs} kg")
-    logger.debug(f"Looking for Bench top set with weight {bench_top_set_weight_kgs} kg")
-    logger.debug(f"Looking for Deadlift top set with weight {deadlift_top_set_weight_kgs} kg")
-    logger.debug(f"Looking for OHP top set with weight {ohp_top_set_weight_kgs} kg")
-
-    squat_top_set = None
-    bench_top_set = None
-    deadlift_top_set = None
-    ohp_top_set = None
-    for workout in workouts:
-        for exercise in workout["exercises"]:
-            if not squat_top_set:
-                squat_top_set = _get_exercise_top_set_reps(exercise, squat_exercise_id, squat_top_set_weight_kgs)
-            if not bench_top_set:
-                bench_top_set = _get_exercise_top_set_reps(exercise, bench_exercise_id, bench_top_set_weight_kgs)
-            if not deadlift_top_set:
-                deadlift_top_set = _get_exercise_top_set_reps(
-                    exercise, deadlift_exercise_id, deadlift_top_set_weight_kgs
-                )
-            if not ohp_top_set:
-                ohp_top_set = _get_exercise_top_set_reps(exercise, ohp_exercise_id, ohp_top_set_weight_kgs)
-
-            if squat_top_set and bench_top_set and deadlift_top_set and ohp_top_set:
-                break
-
-    logger.debug(f"Squats: {squat_top_set}")
-    logger.debug(f"Bench: {bench_top_set}")
-    logger.debug(f"Deadlift: {deadlift_top_set}")
-    logger.debug(f"OHP: {ohp_top_set}")
-    if not squat_top_set or not bench_top_set or not deadlift_top_set or not ohp_top_set:
+    targets = {
+        lift: (config[f"{lift}_exercise_id"], [_top_set(multiplier, config[f"{lift}_tm"], table)])  # type: ignore
+        for lift in cat.MAIN_LIFTS
+    }
+    for lift, (_, (top_set,)) in targets.items():
+        logger.debug("Looking for {lift} top set with weight {weight_kg} kg", lift=lift, weight_kg=top_set["weight_kg"])
+
+    found = h.find_top_sets(workouts, targets)
+    top_sets = {lift: top_set.reps for lift, top_set in found.items()}
+    logger.debug("Found top sets", top_sets=top_sets)
+    if len(top_sets) < len(targets):
         raise RuntimeError("One or more top sets not found.")
-
-    return {"squat": squat_top_set, "bench": bench_top_set, "deadlift": deadlift_top_set, "ohp": ohp_top_set}
-
-
-def _save_with_confirmation(config: c.Config, config_file_name: str) -> None:
+    return top_sets
+
+
+def find_week3_top_sets_reps_in_archive(
+    config: c.Config, multiplier: float, archive: ar.Archive, table: ld.LoadTable | None = None
+) -> dict[str, int]:
+    """Like find_week3_top_sets_reps, but scanning a workout history archive."""
+    targets = {
+        lift: (
+            config[f"{lift}_exercise_id"],  # type: ignore
+            _compute_top_set_weight_kg(multiplier, config[f"{lift}_tm"], table),  # type: ignore
+        )
+        for lift in cat.MAIN_LIFTS
+    }
+    top_sets = ar.find_top_sets_reps(archive, targets)
+    logger.debug("Found top sets", top_sets=top_sets)
+    if any(reps is None for reps in top_sets.values()):
+        raise RuntimeError("One or more top sets not found.")
+    return cast(dict[str, int], top_sets)
+
+
+def _archive_history(api_key: str, config: c.Config, filename: str, table: ld.LoadTable | None = None) -> None:
+    """Save the workout history to an archive, and report the best estimated one rep max of each main lift, in the
+    table's unit (lbs without a table)."""
+    count = ar.write_archive(h.get_all_workouts(api_key), filename)
+    print(f"Archived {count} sets to {filename}")
+    kgs = table is not None and table.unit == "kg"
+    with ar.open_archive(filename) as archive:
+        for lift in cat.MAIN_LIFTS:
+            orm = ar.max_one_rep_max(archive, config[f"{lift}_exercise_id"])  # type: ignore
+            if orm is None:
+                print(f"{lift}: best estimated 1RM n/a")
+            else:
+                print(f"{lift}: best estimated 1RM {orm if kgs else u.kgs_to_lbs(orm):.1f} {'kg' if kgs else 'lbs'}")
+
+
+def _save_with_confirmation(config: c.Config | list[c.Config], config_file_name: str) -> bool:
+    """Save a config, or the athletes of a roster, once the user confirms.  Returns whether it was saved."""
     print("To save these back to your config, please type SAVE.  To abort, hit enter.")
     answer = input("> ")
 
@@ -191,40 +248,49 @@ def _save_with_confirmation(config: c.Config, config_file_name: str) -> None:
         shutil.copyfile(config_file_name, f"{config_file_name}.bak")
 
         print(f"Saving config to {config_file_name}")
-        c.save_config(config, config_file_name)
-    else:
-        print("Aborting...")
+        if isinstance(config, list):
+            c.save_roster(config, config_file_name)
+        else:
+            c.save_config(config, config_file_name)
+        return True
+    print("Aborting...")
+    return False
 
 
 def _handle_maxes(
-    api_key: str, config: c.Config, config_file_name: str, wave: int, workouts: list[h.HevyWorkout]
+    api_key: str,
+    config: c.Config,
+    config_file_name: str,
+    wave: int,
+    workouts: list[h.HevyWorkout] | ar.Archive,
+    table: ld.LoadTable | None = None,
 ) -> None:
-    multiplier = a.TEMPLATE[wave - 1][2][-1][0]
-
     logger.info("Recomputing training maxes")
-    workouts = h.get_workouts(api_key)
     multiplier = a.TEMPLATE[wave - 1][2][-1][0]
-    top_set_reps = find_week3_top_sets_reps(config, multiplier, workouts)
+    if isinstance(workouts, ar.Archive):
+        top_set_reps = find_week3_top_sets_reps_in_archive(config, multiplier, workouts, table)
+    else:
+        top_set_reps = find_week3_top_sets_reps(config, multiplier, workouts, table)
 
     old_squat_tm = config["squat_tm"]
-    squat_top_set_weight = a.round_weight(old_squat_tm * multiplier, ROUND_WEIGHT_PRECISION)
+    squat_top_set_weight = a.load_weight(old_squat_tm * multiplier, ROUND_WEIGHT_PRECISION, table)
 
     old_bench_tm = config["bench_tm"]
-    bench_top_set_weight = a.round_weight(old_bench_tm * multiplier, ROUND_WEIGHT_PRECISION)
+    bench_top_set_weight = a.load_weight(old_bench_tm * multiplier, ROUND_WEIGHT_PRECISION, table)
 
     old_deadlift_tm = config["deadlift_tm"]
-    deadlift_top_set_weight = a.round_weight(old_deadlift_tm * multiplier, ROUND_WEIGHT_PRECISION)
+    deadlift_top_set_weight = a.load_weight(old_deadlift_tm * multiplier, ROUND_WEIGHT_PRECISION, table)
 
     old_ohp_tm = config["ohp_tm"]
-    ohp_top_set_weight = a.round_weight(old_ohp_tm * multiplier, ROUND_WEIGHT_PRECISION)
+    ohp_top_set_weight = a.load_weight(old_ohp_tm * multiplier, ROUND_WEIGHT_PRECISION, table)
 
-    expected_reps = [10, 8, 5, 3][wave - 1]
+    expected_reps = WEEK3_EXPECTED_REPS[wave - 1]
     new_squat_tm = a.compute_new_training_max(
         old_squat_tm,
         squat_top_set_weight,
         expected_reps,
         top_set_reps["squat"],
-        SQUAT_INCREMENT,
+        _increment(SQUAT_INCREMENT, table),
         ONE_REP_MAX_THRESHOLD,
     )
     new_bench_tm = a.compute_new_training_max(
@@ -232,7 +298,7 @@ def _handle_maxes(
         bench_top_set_weight,
         expected_reps,
         top_set_reps["bench"],
-        BENCH_INCREMENT,
+        _increment(BENCH_INCREMENT, table),
         ONE_REP_MAX_THRESHOLD,
     )
     new_deadlift_tm = a.compute_new_training_max(
@@ -240,11 +306,16 @@ def _handle_maxes(
         deadlift_top_set_weight,
         expected_reps,
         top_set_reps["deadlift"],
-        DEADLIFT_INCREMENT,
+        _increment(DEADLIFT_INCREMENT, table),
         ONE_REP_MAX_THRESHOLD,
     )
     new_ohp_tm = a.compute_new_training_max(
-        old_ohp_tm, ohp_top_set_weight, expected_reps, top_set_reps["ohp"], OHP_INCREMENT, ONE_REP_MAX_THRESHOLD
+        old_ohp_tm,
+        ohp_top_set_weight,
+        expected_reps,
+        top_set_reps["ohp"],
+        _increment(OHP_INCREMENT, table),
+        ONE_REP_MAX_THRESHOLD,
     )
 
     print("New Training Maxes:")
@@ -258,18 +329,251 @@ def _handle_maxes(
     _save_with_confirmation(config, config_file_name)
 
 
-def _refresh_accessories(
-    api_key: str, config: c.Config, config_file_name: str, routine_id: str, accessories_name: str
-) -> None:
-    routines = h.get_routines(api_key)
-    exercises = h.get_exercises_from_routine(routine_id, routines)
+def new_training_max(
+    config: c.Config, lift: str, wave: int, top_set_reps: int, table: ld.LoadTable | None = None
+) -> float:
+    """Compute the new training max of a single lift from the reps of its week 3 top set in the given wave."""
+    multiplier = a.TEMPLATE[wave - 1][2][-1][0]
+    old_tm: float = config[f"{lift}_tm"]  # type: ignore
+    return a.compute_new_training_max(
+        old_tm,
+        a.load_weight(old_tm * multiplier, ROUND_WEIGHT_PRECISION, table),
+        WEEK3_EXPECTED_REPS[wave - 1],
+        top_set_reps,
+        _increment(INCREMENTS[lift], table),
+        ONE_REP_MAX_THRESHOLD,
+    )
+
+
+def _week3_targets(config: c.Config, table: ld.LoadTable | None) -> dict[tuple[str, int], tuple[str, list[h.HevySet]]]:
+    """The work sets (without warmups) of the week 3 of each wave, for each main lift.  The whole protocol is matched,
+    since the week 3 top set of a wave can weigh the same as the sets of another week (e.g. 0.75 of the training max
+    is both the wave 1 week 3 top set and the work sets of wave 4 week 1)."""
+    targets = {}
+    for lift in cat.MAIN_LIFTS:
+        exercise_id: str = config[f"{lift}_exercise_id"]  # type: ignore
+        training_max: float = config[f"{lift}_tm"]  # type: ignore
+        for wave in range(1, len(a.TEMPLATE) + 1):
+            protocol = tuple(a.TEMPLATE[wave - 1][2])
+            sets = p.build_exercise(
+                exercise_id, protocol, training_max, ROUND_WEIGHT_PRECISION, lift == "deadlift", table=table
+            )
+            targets[(lift, wave)] = (exercise_id, [s for s in sets["sets"] if s["type"] == "normal"])
+    return targets
+
+
+def _queue_new_maxes(
+    conn: sqlite3.Connection, athlete: c.Config, workouts: list[h.HevyWorkout], table: ld.LoadTable | None
+) -> int:
+    """Queue a training max change for each lift with a week 3 top set in the workouts.  Returns the number queued."""
+    found = h.find_top_sets(workouts, _week3_targets(athlete, table))
+    name = c.athlete_name(athlete)
+    queued = 0
+    for lift in cat.MAIN_LIFTS:
+        waves = [wave for wave in range(1, len(a.TEMPLATE) + 1) if (lift, wave) in found]
+        if not waves:
+            continue
+        # Should the protocols of several waves match, the most recent workout is the one that counts
+        wave = max(waves, key=lambda wave: h.parse_time(found[(lift, wave)].start_time))
+        reps, workout_id, _ = found[(lift, wave)]
+        old_tm: float = athlete[f"{lift}_tm"]  # type: ignore
+        new_tm = new_training_max(athlete, lift, wave, reps, table)
+        if w.queue_change(conn, name, lift, wave, reps, old_tm, new_tm, workout_id):
+            logger.info(
+                "{athlete}: {lift} training max {old_tm} -> {new_tm} is waiting for approval",
+                athlete=name,
+                lift=lift,
+                old_tm=old_tm,
+                new_tm=new_tm,
+            )
+            queued += 1
+    return queued
+
+
+def watch_maxes(conn: sqlite3.Connection, athletes: Iterable[c.Config], gym: str | None = None) -> int:
+    """Poll each account once for workouts it hasn't seen (see juggy.watch), and queue the training max changes of the
+    week 3 top sets found in them.  Athletes sharing an account share a single fetch.
+
+    The first poll of an account only records where its history ends; top sets logged before that are left to
+    `maxes`.
+
+    returns:
+        The number of changes queued.
+    """
+    accounts: dict[str, list[c.Config]] = {}
+    for athlete in athletes:
+        accounts.setdefault(j.account_id(athlete), []).append(athlete)
+
+    queued = 0
+    for account, group in accounts.items():
+        cursor = w.get_cursor(conn, account)
+        try:
+            fetched = h.get_workouts_since(group[0]["api_key"], w.lookback(cursor) if cursor else None)
+            workouts = w.unseen(conn, account, fetched)
+            if cursor is not None:
+                for athlete in group:
+                    queued += _queue_new_maxes(conn, athlete, workouts, c.get_load_table(athlete, gym))
+        except Exception as e:
+            # The cursor stays put, so the same workouts are looked at again on the next poll
+            logger.error(
+                "Failed to poll {athletes}",
+                athletes=", ".join(c.athlete_name(athlete) for athlete in group),
+                error=str(e),
+            )
+            continue
+        # An account without workouts yet is watched from the start
+        new_cursor = max(filter(None, [w.newest_start_time(fetched), cursor]), key=h.parse_time, default=w.EPOCH)
+        w.mark_seen(conn, account, workouts, new_cursor)
+        w.set_cursor(conn, account, new_cursor)
+    return queued
 
-    if exercises:
-        print(f"Found {len(exercises)} accessories with id {routine_id} for {accessories_name}")
-        config[f"{accessories_name}_accessories"] = exercises  # type: ignore
+
+def _watch(
+    load_athletes: Callable[[], Iterable[c.Config]], watch_file: str, interval: float, once: bool, gym: str | None
+) -> None:
+    """Poll for new week 3 top sets every interval seconds.  The athletes are reloaded before each poll, so approved
+    changes are picked up."""
+    with closing(w.connect(watch_file)) as conn:
+        while True:
+            queued = watch_maxes(conn, load_athletes(), gym)
+            logger.info(
+                "Queued {queued} training max change(s), {pending} waiting for approval",
+                queued=queued,
+                pending=len(w.get_changes(conn)),
+            )
+            if once:
+                return
+            time.sleep(interval)
+
+
+def _approve(watch_file: str, config_file_name: str, roster: bool, change_ids: list[int] | None, reject: bool) -> None:
+    """Apply pending training max changes to the config (or roster) after confirmation, or reject them."""
+    with closing(w.connect(watch_file)) as conn:
+        changes = [change for change in w.get_changes(conn) if not change_ids or change["id"] in change_ids]
+        if not changes:
+            print("No training max changes are waiting for approval")
+            return
+
+        print("Pending Training Max Changes:")
+        print("-----------------------------")
+        for change in changes:
+            print(
+                f"{change['id']}: {change['athlete']} {change['lift']}: {change['old_tm']}\t-> {change['new_tm']}"
+                f"\t(wave {change['wave']} top set of {change['reps']} reps)"
+            )
+        print("\n")
+
+        if reject:
+            w.decide(conn, [change["id"] for change in changes], "rejected")
+            print(f"Rejected {len(changes)} change(s)")
+            return
+
+        athletes = list(c.load_roster(config_file_name)) if roster else [c.load_config(config_file_name)]
+        by_name = {c.athlete_name(athlete): athlete for athlete in athletes}
+        applied = []
+        for change in changes:
+            athlete = by_name.get(change["athlete"])
+            key = f"{change['lift']}_tm"
+            if athlete is None or athlete[key] != change["old_tm"]:  # type: ignore
+                logger.warning(
+                    "Skipping change {change_id}: {athlete} is not in {file}, or their {lift} training max changed "
+                    "since",
+                    change_id=change["id"],
+                    athlete=change["athlete"],
+                    file=config_file_name,
+                    lift=change["lift"],
+                )
+                continue
+            athlete[key] = change["new_tm"]  # type: ignore
+            applied.append(change["id"])
+
+        if applied and _save_with_confirmation(athletes if roster else athletes[0], config_file_name):
+            w.decide(conn, applied, "approved")
+
+
+def _refresh_accessories(api_key: str, config: c.Config, config_file_name: str, routine_ids: dict[str, str]) -> None:
+    """Replace the accessories of each given lift with the exercises of a routine, e.g. {"squat": routine_id}.
+    All routines are fetched concurrently."""
+    routines = h.get_routines_by_id(api_key, list(set(routine_ids.values())))
+
+    found = 0
+    for accessories_name, routine_id in routine_ids.items():
+        routine = routines[routine_id]
+        if routine:
+            exercises = h.tidy_exercises(routine["exercises"])
+            print(f"Found {len(exercises)} accessories with id {routine_id} for {accessories_name}")
+            config[f"{accessories_name}_accessories"] = exercises  # type: ignore
+            found += 1
+        else:
+            logger.warning(
+                "Routine with id {routine_id} not found for {accessories}",
+                routine_id=routine_id,
+                accessories=accessories_name,
+            )
+
+    if found:
         _save_with_confirmation(config, config_file_name)
+
+
+def _accessories_arg(value: str) -> tuple[str, str]:
+    """Parse a LIFT=ROUTINE_ID command line argument."""
+    lift, _, routine_id = value.partition("=")
+    if lift not in cat.MAIN_LIFTS or not routine_id:
+        lifts = ", ".join(cat.MAIN_LIFTS)
+        raise argparse.ArgumentTypeError(f"Expected LIFT=ROUTINE_ID with LIFT one of {lifts}: {value}")
+    return lift, routine_id
+
+
+def _export(
+    athletes: Iterable[c.Config],
+    wave: int | None,
+    week: int | None,
+    gym: str | None,
+    format: str,
+    output: str,
+    start_date: date | None,
+) -> None:
+    """Export the program of every athlete, for one week or wave or the whole cycle, to a file (or stdout if "-")."""
+    waves = [wave] if wave else [1, 2, 3, 4]
+    weeks = [week] if week else [1, 2, 3, 4]
+    sessions = ex.iter_sessions(athletes, waves, weeks, gym)
+    if output == "-":
+        count = ex.export(sessions, format, sys.stdout, start_date)
     else:
-        logger.warning(f"Routine with id {routine_id} not found for {accessories_name}")
+        with open(output, "w", newline="") as file:
+            count = ex.export(sessions, format, file, start_date)
+        logger.info("Exported {count} sessions to {output}", count=count, output=output)
+
+
+def _work(
+    queue: str, workers: int, max_attempts: int, gym: str | None, catalog_file: str, athletes: Iterable[c.Config]
+) -> None:
+    """Drain the job queue, setting up the week of each queued athlete, as currently configured in athletes (the
+    roster is read once, when the run starts).  Athletes no longer in the roster, or whose config references unknown
+    exercise IDs, fail before any writes, and aren't retried."""
+    by_name = {c.athlete_name(athlete): athlete for athlete in athletes}
+    lock = threading.Lock()
+    index: cat.CatalogIndex | None = None
+
+    def catalog_index(api_key: str) -> cat.CatalogIndex:
+        # The catalog is shared by all accounts, so it's synced once, by the first job
+        nonlocal index
+        with lock:
+            if index is None:
+                index = cat.build_index(cat.sync_catalog(api_key, catalog_file))
+            return index
+
+    def run_job(job: j.Job) -> None:
+        config = by_name.get(job["athlete"])
+        if config is None:
+            raise j.InvalidJobError(f"{job['athlete']} is not in the roster")
+        problems = cat.validate_config(config, catalog_index(config["api_key"]))
+        if problems:
+            raise j.InvalidJobError("; ".join(problems))
+        _setup_week(config["api_key"], config, job["wave"], job["week"], c.get_load_table(config, gym))
+
+    counts = j.work(run_job, queue, workers, max_attempts)
+    print(f"Jobs: {counts}")
 
 
 def main() -> None:
@@ -277,15 +581,35 @@ def main() -> None:
     parser.add_argument(
         "-c",
         "--command",
-        choices=["program", "maxes", "refresh_accessories"],
+        choices=[
+            "program",
+            "maxes",
+            "refresh_accessories",
+            "exercises",
+            "export",
+            "apply",
+            "enqueue",
+            "work",
+            "archive",
+            "watch",
+            "approve",
+        ],
         required=True,
         help="The command to execute.  `program`will set up the routines for the week. "
         "`maxes` will recompute training maxes for the next wave. "
+        "`exercises` will look up exercise templates by ID or name. "
+        "`export` will write programs to a file without using the API, for a week, a wave or the whole cycle. "
+        "`apply` will execute a plan saved by `program --dry-run`. "
+        "`enqueue` will queue a week for every athlete of the roster (or the config), and `work` will program them, "
+        "as currently configured in the roster (or the config). "
+        "`archive` will save the workout history to the --output file, for use with `maxes --archive`. "
+        "`watch` will poll for new week 3 top sets of the roster (or the config) and queue training max changes, "
+        "which `approve` will apply to the roster (or the config) after confirmation. "
         "When using `program`, --wave and --week are required. "
         "When using `maxes`, --foo is required",
     )
-    parser.add_argument("--wave", type=int, help="The wave of the program (1-4)")
-    parser.add_argument("--week", type=int, help="The week number of the program (1-4)")
+    parser.add_argument("--wave", type=int, choices=range(1, 5), help="The wave of the program (1-4)")
+    parser.add_argument("--week", type=int, choices=range(1, 5), help="The week number of the program (1-4)")
     parser.add_argument("--config", type=str, default="config.json", help="Config file to use")
     parser.add_argument(
         "--routine-id",
@@ -294,26 +618,125 @@ def main() -> None:
     )
     parser.add_argument(
         "--accessories-type",
-        choices=["squat", "bench", "deadlift", "ohp"],
+        choices=cat.MAIN_LIFTS,
         help="The type of the accessories to refresh",
     )
+    parser.add_argument(
+        "--accessories",
+        type=_accessories_arg,
+        nargs="+",
+        metavar="LIFT=ROUTINE_ID",
+        help="Refresh the accessories of several lifts at once, e.g. squat=ID1 bench=ID2",
+    )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        default=cat.CATALOG_FILE,
+        help="File used to cache the exercise template catalog",
+    )
+    parser.add_argument("--gym", type=str, help="The gym (from `gyms` in the config) whose equipment to program for")
+    parser.add_argument("--name", type=str, help="Exercise ID or part of an exercise name to look up")
+    parser.add_argument("--refresh", action="store_true", help="Force a download of the exercise catalog")
+    parser.add_argument(
+        "--roster", type=str, help="JSON Lines file with one athlete config per line, instead of the config"
+    )
+    parser.add_argument("--format", choices=ex.FORMATS, default="csv", help="Export file format")
+    parser.add_argument("--output", type=str, default="-", help="Export or plan file, or - for stdout")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="With `program`, only print (or save to --output) the planned API operations",
+    )
+    parser.add_argument("--plan", type=str, help="Plan file to execute with `apply`")
+    parser.add_argument("--archive", type=str, help="With `maxes`, use this workout history archive instead of the API")
+    parser.add_argument("--queue", type=str, default=j.QUEUE_FILE, help="Job queue database file")
+    parser.add_argument("--workers", type=int, default=4, help="Number of workers draining the job queue")
+    parser.add_argument(
+        "--max-attempts", type=int, default=j.MAX_ATTEMPTS, help="Number of times a failing job is attempted"
+    )
+    parser.add_argument("--watch-file", type=str, default=w.WATCH_FILE, help="Watch cursor and change database file")
+    parser.add_argument(
+        "--interval", type=float, default=w.POLL_INTERVAL_SECONDS, help="Seconds between polls of `watch`"
+    )
+    parser.add_argument("--once", action="store_true", help="With `watch`, poll once and exit")
+    parser.add_argument("--change", type=int, nargs="+", help="With `approve`, only these change IDs")
+    parser.add_argument("--reject", action="store_true", help="With `approve`, reject the changes instead")
+    parser.add_argument(
+        "--log-level", type=str.upper, choices=lg.LEVELS, default=lg.DEFAULT_LEVEL, help="Minimum level to log"
+    )
+    parser.add_argument("--log-format", choices=lg.FORMATS, default="text", help="Log records as text or JSON lines")
+    parser.add_argument(
+        "--start-date",
+        type=date.fromisoformat,
+        help="Date (YYYY-MM-DD) of the first exported week, for ICS exports.  Defaults to today",
+    )
 
     args = parser.parse_args()
+    lg.setup(args.log_level, args.log_format)
+    if args.command == "export":
+        athletes = c.load_roster(args.roster) if args.roster else [c.load_config(args.config)]
+        _export(athletes, args.wave, args.week, args.gym, args.format, args.output, args.start_date)
+        return
+    elif args.command == "enqueue":
+        if not args.wave or not args.week:
+            parser.error("Wave and week are required for enqueue")
+        athletes = c.load_roster(args.roster) if args.roster else [c.load_config(args.config)]
+        with closing(j.connect(args.queue)) as conn:
+            added = j.enqueue(conn, athletes, args.wave, args.week)
+            print(f"Queued {added} job(s).  Jobs: {j.status(conn)}")
+        return
+    elif args.command == "work":
+        athletes = c.load_roster(args.roster) if args.roster else [c.load_config(args.config)]
+        _work(args.queue, args.workers, args.max_attempts, args.gym, args.catalog, athletes)
+        return
+    elif args.command == "watch":
+
+        def load_athletes() -> Iterable[c.Config]:
+            return c.load_roster(args.roster) if args.roster else [c.load_config(args.config)]
+
+        _watch(load_athletes, args.watch_file, args.interval, args.once, args.gym)
+        return
+    elif args.command == "approve":
+        _approve(args.watch_file, args.roster or args.config, bool(args.roster), args.change, args.reject)
+        return
+
     config = c.load_config(args.config)
     api_key = config["api_key"]
+    table = c.get_load_table(config, args.gym)
 
     if args.command == "program":
         if not args.wave or not args.week:
             parser.error("Wave and week are required for program")
-        _setup_week(api_key, config, args.wave, args.week)
+        _validate_exercise_ids(api_key, config, args.catalog)
+        if args.dry_run:
+            _dry_run(api_key, config, args.wave, args.week, table, args.output)
+        else:
+            _setup_week(api_key, config, args.wave, args.week, table)
     elif args.command == "maxes":
         if not args.wave:
             parser.error("Wave is required for maxes")
-        _handle_maxes(api_key, config, args.config, args.wave, h.get_workouts(api_key))
+        if args.archive:
+            with ar.open_archive(args.archive) as archive:
+                _handle_maxes(api_key, config, args.config, args.wave, archive, table)
+        else:
+            _handle_maxes(api_key, config, args.config, args.wave, h.get_workouts(api_key), table)
     elif args.command == "refresh_accessories":
-        if not args.routine_id or not args.accessories_type:
-            parser.error("Routine id and accessories type are required for refresh_accessories")
-        _refresh_accessories(api_key, config, args.config, args.routine_id, args.accessories_type)
+        routine_ids = dict(args.accessories or [])
+        if args.routine_id and args.accessories_type:
+            routine_ids[args.accessories_type] = args.routine_id
+        if not routine_ids:
+            parser.error("Routine id and accessories type, or accessories, are required for refresh_accessories")
+        _refresh_accessories(api_key, config, args.config, routine_ids)
+    elif args.command == "exercises":
+        _lookup_exercises(api_key, args.catalog, args.name, args.refresh)
+    elif args.command == "archive":
+        if args.output == "-":
+            parser.error("Output file is required for archive")
+        _archive_history(api_key, config, args.output, table)
+    elif args.command == "apply":
+        if not args.plan:
+            parser.error("Plan is required for apply")
+        pl.apply_plan(api_key, pl.load_plan(args.plan))
 
 
 if __name__ == "__main__":
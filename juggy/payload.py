@@ -0,0 +1,148 @@
+"""Builds canonical, pre-serialized routine payloads for the Hevy API.
+
+Generated sets are memoized by (protocol, training max, rounding, deadlift flag), so athletes sharing a training max
+(or the same athlete across runs) reuse the same work.  Payloads are immutable and serialized in a canonical form, so
+their digest can be used to detect whether a routine actually changed."""
+
+import hashlib
+import json
+from collections.abc import Sequence
+from functools import lru_cache
+from typing import Any, NamedTuple, cast
+
+from loguru import logger
+
+import juggy.algo as a
+import juggy.hevy as h
+from juggy import util as u
+from juggy.loading import LoadTable, Unit
+
+# Weights are rounded up to a multiple of this, without a load table
+ROUND_WEIGHT_PRECISION = 5
+
+# A protocol in hashable form, see algo.TEMPLATE
+Protocol = tuple[tuple[float, int], ...]
+# An immutable (type, weight_kg, reps) set
+SetSpec = tuple[str, float, int]
+
+
+class RoutinePayload(NamedTuple):
+    """A routine ready to be sent to the Hevy API."""
+
+    title: str
+    folder_id: int
+    # Body for creating the routine (POST)
+    create_body: bytes
+    # Body for updating the routine (PUT), which must not contain the folder
+    update_body: bytes
+
+
+def lifts_to_hevy_sets(lifts: list[tuple[float | int, int] | None], unit: Unit = "lb") -> list[h.HevySet]:
+    """Convert a list of lifts, weighed in the given unit, to a list of sets for the Hevy API."""
+    exercises = []
+    type = "warmup"
+    for lift in lifts:
+        if lift is None:
+            type = "normal"
+            continue
+        weight, reps = lift
+        weight_kg = u.lbs_to_kgs(weight) if unit == "lb" else weight
+        exercises.append({"type": type, "weight_kg": weight_kg, "reps": reps})
+    return cast(list[h.HevySet], exercises)
+
+
+@lru_cache(maxsize=4096)
+def generate_lifts(
+    protocol: Protocol,
+    training_max: float,
+    round: int = 5,
+    is_deadlift: bool = False,
+    table: LoadTable | None = None,
+) -> tuple[tuple[float, int] | None, ...]:
+    """Memoized algo.generate_lifts, with weights in the table's unit (lbs without a table)."""
+    return tuple(a.generate_lifts(list(protocol), training_max, round, is_deadlift, table))
+
+
+@lru_cache(maxsize=4096)
+def generate_sets(
+    protocol: Protocol,
+    training_max: float,
+    round: int = 5,
+    is_deadlift: bool = False,
+    table: LoadTable | None = None,
+) -> tuple[SetSpec, ...]:
+    """Generate the sets for a main lift, memoized."""
+    lifts = list(generate_lifts(protocol, training_max, round, is_deadlift, table))
+    unit = table.unit if table else "lb"
+    return tuple((s["type"], s["weight_kg"], s["reps"]) for s in lifts_to_hevy_sets(lifts, unit))
+
+
+def build_exercise(
+    exercise_id: str,
+    protocol: Protocol | list[tuple[float, int]],
+    training_max: float,
+    round: int = 5,
+    is_deadlift: bool = False,
+    notes: str = "",
+    table: LoadTable | None = None,
+) -> h.HevyExercise:
+    """Build a fresh HevyExercise for a main lift.  The result is owned by the caller and safe to mutate."""
+    sets = generate_sets(tuple(protocol), training_max, round, is_deadlift, table)
+    return {
+        "exercise_template_id": exercise_id,
+        "notes": notes,
+        "sets": [
+            cast(h.HevySet, {"type": type, "weight_kg": weight_kg, "reps": reps}) for type, weight_kg, reps in sets
+        ],
+    }
+
+
+def canonical_json(obj: Any) -> bytes:
+    """Serialize to JSON deterministically: sorted keys, no insignificant whitespace."""
+    return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()
+
+
+def _comparable(exercises: Sequence[h.HevyExercise]) -> list[dict[str, Any]]:
+    """Reduce exercises to the fields we write, in a form that compares equal between what we send and what the API
+    returns.  The API adds fields (index, title, ...), sends null notes and may not return weights bit for bit."""
+    return [
+        {
+            "exercise_template_id": exercise["exercise_template_id"],
+            "notes": exercise.get("notes") or "",
+            "sets": [
+                {
+                    "type": s.get("type"),
+                    "weight_kg": None if s.get("weight_kg") is None else round(s["weight_kg"], 2),
+                    "reps": s.get("reps"),
+                }
+                for s in exercise["sets"]
+            ],
+        }
+        for exercise in exercises
+    ]
+
+
+def routine_digest(title: str, exercises: Sequence[h.HevyExercise]) -> str:
+    """Hash the content of a routine, so a routine to send and one returned by the API have the same digest if they
+    hold the same sets.  The folder is excluded, so moving a routine doesn't count as a change."""
+    return hashlib.sha256(canonical_json({"title": title, "exercises": _comparable(exercises)})).hexdigest()
+
+
+def serialize_routine(title: str, folder_id: int, exercises: Sequence[h.HevyExercise]) -> RoutinePayload:
+    """Serialize a routine with exactly the given exercises."""
+    return RoutinePayload(
+        title=title,
+        folder_id=folder_id,
+        create_body=canonical_json({"routine": {"title": title, "folder_id": folder_id, "exercises": exercises}}),
+        update_body=canonical_json({"routine": {"title": title, "exercises": exercises}}),
+    )
+
+
+def merge_accessories(
+    title: str, exercises: Sequence[h.HevyExercise], accessories: Sequence[h.HevyExercise] | None
+) -> list[h.HevyExercise]:
+    """Return a new list of the exercises followed by the accessories.  Neither input is modified."""
+    if accessories:
+        return [*exercises, *accessories]
+    logger.warning("No accessories provided for routine {title}", title=title)
+    return list(exercises)
@@ -0,0 +1,175 @@
+"""Planning of the API writes needed to set up a week.
+
+A plan is computed from the folders and routines already in the account, and lists every operation that would be sent
+to the API (or that nothing needs to be sent for a routine).  Plans serialize to JSON, so they can be audited before
+they are executed, or executed later.
+
+A saved plan records the account it was made for, and each operation the state of the routine it was planned against.
+Applying it re-fetches the folders and routines, and refuses if the account is another one or anything a planned
+operation relies on has changed since."""
+
+import json
+from collections import Counter
+from collections.abc import Sequence
+from typing import Literal, TypedDict, cast
+
+from loguru import logger
+
+import juggy.hevy as h
+import juggy.payload as p
+
+Action = Literal["create_folder", "create_routine", "update_routine", "noop"]
+
+
+class Operation(TypedDict):
+    """A single step of a plan."""
+
+    action: Action
+    title: str
+    # None when the folder is created by an earlier operation of the same plan
+    folder_id: int | None
+    # The routine being updated, or left untouched by a noop
+    routine_id: int | None
+    # The full content of the routine, empty for folders
+    exercises: list[h.HevyExercise]
+    # Digest of the routine as planned, see payload.routine_digest
+    digest: str | None
+    # Digest of the existing routine when planned, None if there was none.  Equal to digest for a noop.
+    base: str | None
+
+
+class SavedPlan(TypedDict):
+    """A plan as saved to a file, to be applied later."""
+
+    # The account the plan was made for, see hevy.account_id
+    account: str
+    operations: list[Operation]
+
+
+def build_plan(
+    folders: list[h.HevyRoutineFolder],
+    routines: list[h.HevyRoutine],
+    folder_name: str,
+    wanted: Sequence[tuple[str, list[h.HevyExercise]]],
+) -> list[Operation]:
+    """Compute the operations needed for the folder to contain the wanted (title, exercises) routines."""
+    plan: list[Operation] = []
+    folder = next((f for f in folders if f["title"] == folder_name), None)
+    folder_id = folder["id"] if folder else None
+    if folder_id is None:
+        plan.append(
+            {
+                "action": "create_folder",
+                "title": folder_name,
+                "folder_id": None,
+                "routine_id": None,
+                "exercises": [],
+                "digest": None,
+                "base": None,
+            }
+        )
+
+    for title, exercises in wanted:
+        existing = h.find_routine(routines, title, folder_id) if folder_id is not None else None
+        digest = p.routine_digest(title, exercises)
+        base = p.routine_digest(existing["title"], existing["exercises"]) if existing else None
+        action: Action
+        if existing is None:
+            action = "create_routine"
+        elif base == digest:
+            action = "noop"
+        else:
+            action = "update_routine"
+        plan.append(
+            {
+                "action": action,
+                "title": title,
+                "folder_id": folder_id,
+                "routine_id": existing["id"] if existing else None,
+                "exercises": exercises,
+                "digest": digest,
+                "base": base,
+            }
+        )
+    return plan
+
+
+def execute_plan(api_key: str, plan: list[Operation]) -> None:
+    """Send the operations of a plan to the API, in order."""
+    created_folder_id = None
+    for op in plan:
+        action, title = op["action"], op["title"]
+        folder_id = op["folder_id"] if op["folder_id"] is not None else created_folder_id
+        if action == "create_folder":
+            logger.info("Creating folder {title}", title=title)
+            created_folder_id = h.create_folder(api_key, title)["id"]
+            logger.info("Created {title} folder with id {folder_id}", title=title, folder_id=created_folder_id)
+        elif action == "noop":
+            logger.info("Routine {title} is up to date", title=title)
+        elif folder_id is None:
+            raise RuntimeError(f"No folder to {action} {title} in")
+        elif action == "create_routine":
+            logger.info("Creating routine {title} in folder {folder_id}", title=title, folder_id=folder_id)
+            h.create_routine(api_key, p.serialize_routine(title, folder_id, op["exercises"]).create_body)
+        elif action == "update_routine":
+            logger.info("Updating routine {title} with id {routine_id}", title=title, routine_id=op["routine_id"])
+            routine_id = cast(int, op["routine_id"])
+            h.update_routine(api_key, routine_id, p.serialize_routine(title, folder_id, op["exercises"]).update_body)
+        else:
+            raise ValueError(f"Invalid plan action: {action}")
+
+
+def validate_plan(
+    plan: list[Operation], folders: list[h.HevyRoutineFolder], routines: list[h.HevyRoutine]
+) -> list[str]:
+    """Check each operation of a plan against the current folders and routines.
+
+    returns:
+        Why each operation that no longer fits the account can't be executed as planned.  Empty if they all fit.
+    """
+    problems = []
+    folder_ids = {f["id"] for f in folders}
+    for op in plan:
+        action, title, folder_id = op["action"], op["title"], op["folder_id"]
+        if action == "create_folder":
+            if any(f["title"] == title for f in folders):
+                problems.append(f"Folder {title} was created since")
+        elif op["routine_id"] is None:
+            if folder_id is not None and folder_id not in folder_ids:
+                problems.append(f"The folder of routine {title} was deleted since")
+            elif folder_id is not None and h.find_routine(routines, title, folder_id) is not None:
+                problems.append(f"Routine {title} was created since")
+        else:
+            routine = h.find_routine_by_id(op["routine_id"], routines)
+            if routine is None:
+                problems.append(f"Routine {title} was deleted since")
+                continue
+            digest = p.routine_digest(routine["title"], routine["exercises"])
+            if routine["folder_id"] != folder_id or digest != op["base"]:
+                problems.append(f"Routine {title} was changed since")
+    return problems
+
+
+def apply_plan(api_key: str, saved: SavedPlan) -> None:
+    """Execute a saved plan, once checked against the current state of the account."""
+    if saved["account"] != h.account_id(api_key):
+        raise RuntimeError("The plan was made for another account")
+    problems = validate_plan(saved["operations"], h.get_folders(api_key), h.get_routines(api_key))
+    if problems:
+        raise RuntimeError("The account changed since the plan was made, plan again: " + "; ".join(problems))
+    execute_plan(api_key, saved["operations"])
+
+
+def summarize(plan: list[Operation]) -> dict[str, int]:
+    """Count the operations of a plan by action."""
+    return dict(Counter(op["action"] for op in plan))
+
+
+def save_plan(saved: SavedPlan, filename: str) -> None:
+    with open(filename, "w") as file:
+        json.dump(saved, file, indent=4)
+
+
+def load_plan(filename: str) -> SavedPlan:
+    with open(filename) as file:
+        return cast(SavedPlan, json.load(file))
@@ -4,6 +4,8 @@ import math
 
 # Number of kilograms in one pound
 LBS_TO_KGS_RATIO = 0.45359237
+# Weights within this many kg of each other are the same weight, to allow for floating point and API rounding
+WEIGHT_TOLERANCE_KG = 0.01
 
 
 def round_weight(weight: int | float, precision: int | float = 5) -> float:
@@ -19,6 +21,11 @@ def lbs_to_kgs(lbs: int | float) -> float:
     return lbs * LBS_TO_KGS_RATIO
 
 
+def weights_equal(weight1_kg: float, weight2_kg: float) -> bool:
+    """Compare two weights in kg, allowing for small floating point differences."""
+    return abs(weight1_kg - weight2_kg) < WEIGHT_TOLERANCE_KG
+
+
 def kgs_to_lbs(kgs: int | float) -> float:
     """Convert kgs to lbs."""
     return kgs / LBS_TO_KGS_RATIO
@@ -0,0 +1,151 @@
+"""Incremental training max updates, driven by newly logged workouts.
+
+A cursor per account remembers the start time of the newest workout seen.  Each poll fetches the workouts that started
+up to LOOKBACK_SECONDS before it (usually a single page), and skips the ones already seen, by ID.  The lookback catches
+workouts logged after the fact, or sharing the cursor's start time.  New week 3 top sets found in the new workouts
+become training max changes, which wait in a queue until they are approved or rejected.  Cursors, seen workouts and
+changes are kept in an SQLite database."""
+
+import sqlite3
+import time
+from collections.abc import Iterable
+from datetime import timedelta
+from typing import Literal, TypedDict, cast
+
+import juggy.hevy as h
+
+WATCH_FILE = "juggy-watch.db"
+POLL_INTERVAL_SECONDS = 15 * 60
+# The cursor of an account that has no workouts yet, so its first workout counts as new
+EPOCH = "1970-01-01T00:00:00+00:00"
+# Workouts that started up to this long before the cursor are still picked up, e.g. when logged after the fact
+LOOKBACK_SECONDS = 7 * 24 * 60 * 60
+
+ChangeStatus = Literal["pending", "approved", "rejected"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cursors (
+    account TEXT PRIMARY KEY,
+    start_time TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seen (
+    account TEXT NOT NULL,
+    workout_id TEXT NOT NULL,
+    start_time REAL NOT NULL,
+    PRIMARY KEY (account, workout_id)
+);
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY,
+    athlete TEXT NOT NULL,
+    lift TEXT NOT NULL,
+    wave INTEGER NOT NULL,
+    reps INTEGER NOT NULL,
+    old_tm REAL NOT NULL,
+    new_tm REAL NOT NULL,
+    workout_id TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at REAL NOT NULL,
+    UNIQUE (athlete, lift, workout_id)
+);
+"""
+
+
+class Change(TypedDict):
+    """A training max change waiting for (or given) approval."""
+
+    id: int
+    athlete: str
+    lift: str
+    wave: int
+    # Reps of the week 3 top set that triggered the change
+    reps: int
+    old_tm: float
+    new_tm: float
+    workout_id: str
+    status: ChangeStatus
+
+
+def connect(filename: str = WATCH_FILE) -> sqlite3.Connection:
+    """Open (and create if needed) the watch database."""
+    conn = sqlite3.connect(filename, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def get_cursor(conn: sqlite3.Connection, account: str) -> str | None:
+    """The start time of the newest workout seen for an account, or None if it was never polled."""
+    row = conn.execute("SELECT start_time FROM cursors WHERE account = ?", (account,)).fetchone()
+    return row["start_time"] if row else None
+
+
+def set_cursor(conn: sqlite3.Connection, account: str, start_time: str) -> None:
+    conn.execute(
+        "INSERT INTO cursors (account, start_time, updated_at) VALUES (?, ?, ?) "
+        "ON CONFLICT (account) DO UPDATE SET start_time = excluded.start_time, updated_at = excluded.updated_at",
+        (account, start_time, time.time()),
+    )
+
+
+def newest_start_time(workouts: Iterable[h.HevyWorkout]) -> str | None:
+    """The start time of the newest of the workouts, to use as the next cursor."""
+    return max((w["start_time"] for w in workouts), key=h.parse_time, default=None)
+
+
+def lookback(cursor: str) -> str:
+    """The start time to fetch workouts from, for a cursor."""
+    return (h.parse_time(cursor) - timedelta(seconds=LOOKBACK_SECONDS)).isoformat()
+
+
+def _workout_id(workout: h.HevyWorkout) -> str:
+    return workout.get("id", workout["start_time"])
+
+
+def unseen(conn: sqlite3.Connection, account: str, workouts: list[h.HevyWorkout]) -> list[h.HevyWorkout]:
+    """The workouts not yet seen for an account, in the same order."""
+    seen = {row["workout_id"] for row in conn.execute("SELECT workout_id FROM seen WHERE account = ?", (account,))}
+    return [workout for workout in workouts if _workout_id(workout) not in seen]
+
+
+def mark_seen(conn: sqlite3.Connection, account: str, workouts: list[h.HevyWorkout], cursor: str) -> None:
+    """Remember the workouts as seen, and forget the ones that fell out of the lookback of the cursor."""
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT OR IGNORE INTO seen (account, workout_id, start_time) VALUES (?, ?, ?)",
+        [(account, _workout_id(w), h.parse_time(w["start_time"]).timestamp()) for w in workouts],
+    )
+    conn.execute(
+        "DELETE FROM seen WHERE account = ? AND start_time < ?",
+        (account, h.parse_time(lookback(cursor)).timestamp()),
+    )
+    conn.execute("COMMIT")
+
+
+def queue_change(
+    conn: sqlite3.Connection,
+    athlete: str,
+    lift: str,
+    wave: int,
+    reps: int,
+    old_tm: float,
+    new_tm: float,
+    workout_id: str,
+) -> bool:
+    """Queue a training max change for approval.  Returns False if the workout already queued one for the lift."""
+    cursor = conn.execute(
+        "INSERT OR IGNORE INTO changes (athlete, lift, wave, reps, old_tm, new_tm, workout_id, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (athlete, lift, wave, reps, old_tm, new_tm, workout_id, time.time()),
+    )
+    return cursor.rowcount > 0
+
+
+def get_changes(conn: sqlite3.Connection, status: ChangeStatus = "pending") -> list[Change]:
+    rows = conn.execute("SELECT * FROM changes WHERE status = ? ORDER BY id", (status,))
+    return [cast(Change, dict(row)) for row in rows]
+
+
+def decide(conn: sqlite3.Connection, change_ids: Iterable[int], status: ChangeStatus) -> None:
+    """Mark changes approved or rejected."""
+    conn.executemany("UPDATE changes SET status = ? WHERE id = ?", [(status, change_id) for change_id in change_ids])
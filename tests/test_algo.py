@@ -11,6 +11,7 @@ from juggy.algo import (
     generate_lifts,
     generate_warmups,
 )
+from juggy.loading import build_table
 
 
 def test_deload_week_structure() -> None:
@@ -132,3 +133,13 @@ def test_compute_new_training_max(
         )
         == expected
     )
+
+
+def test_generate_lifts_with_load_table() -> None:
+    """Test that a load table drives both warmup starts and snapping, in its own unit."""
+    table = build_table({"unit": "kg", "plates": [20, 20, 10, 5, 2.5, 1.25], "rounding": "nearest"})
+    result = generate_lifts(TEMPLATE[0][2], 130, 5, False, table)
+    assert all(lift is None or lift[0] in table.loads for lift in result)
+    assert result == [(20, 10), (32.5, 5), (45, 3), (57.5, 2), None, (65, 5), (77.5, 3), (90, 1), (97.5, 10)]
+    deadlift = generate_lifts(TEMPLATE[0][2], 130, 5, True, table)
+    assert deadlift[0] == (30, 10)
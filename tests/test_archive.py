@@ -0,0 +1,179 @@
+"""Tests for the workout history archive."""
+
+import json
+import math
+from pathlib import Path
+
+import pytest
+import requests
+
+import juggy.archive as ar
+import juggy.hevy as h
+import juggy.main as m
+from benchmarks import synthetic as s
+from juggy.algo import TEMPLATE, compute_one_rep_max
+from juggy.loading import build_table
+from juggy.util import kgs_to_lbs
+
+WORKOUTS: list[h.HevyWorkout] = [
+    {
+        "title": "Newer",
+        "is_private": False,
+        "start_time": "2024-03-08T10:00:00Z",
+        "end_time": "2024-03-08T11:00:00Z",
+        "exercises": [
+            {
+                "exercise_template_id": "SQUAT",
+                "notes": "",
+                "sets": [
+                    {"type": "warmup", "weight_kg": 20, "reps": 10},
+                    {"type": "normal", "weight_kg": 100, "reps": 7},
+                ],
+            },
+            {
+                "exercise_template_id": "PLANK",
+                "notes": "",
+                "sets": [{"type": "normal", "weight_kg": None, "reps": None}],  # type: ignore
+            },
+        ],
+    },
+    {
+        "title": "Older",
+        "is_private": False,
+        "start_time": "2024-03-01T10:00:00Z",
+        "end_time": "2024-03-01T11:00:00Z",
+        "exercises": [
+            {
+                "exercise_template_id": "SQUAT",
+                "notes": "",
+                "sets": [
+                    {"type": "normal", "weight_kg": 100, "reps": 5},
+                    {"type": "normal", "weight_kg": 110, "reps": 8},
+                ],
+            },
+        ],
+    },
+]
+
+
+@pytest.fixture
+def archive_file(tmp_path: Path) -> str:
+    filename = str(tmp_path / "history.jca")
+    assert ar.write_archive(WORKOUTS, filename) == 5
+    return filename
+
+
+def test_round_trip(archive_file: str) -> None:
+    """Test that rows are stored chronologically, column by column."""
+    with ar.open_archive(archive_file) as archive:
+        assert ar.rows(archive) == 5
+        assert archive.exercise_ids == ["SQUAT", "PLANK"]
+        assert list(archive.exercises) == [0, 0, 0, 0, 1]
+        assert list(archive.set_indexes) == [0, 1, 0, 1, 0]
+        assert list(archive.reps) == [5, 8, 10, 7, 0]
+        assert list(archive.weights_kg)[:4] == [100, 110, 20, 100]
+        assert math.isnan(archive.weights_kg[4])
+        assert archive.timestamps[0] == 1709287200
+        assert archive.timestamps[2] - archive.timestamps[0] == 7 * 24 * 60 * 60
+
+
+def test_find_top_sets_reps(archive_file: str) -> None:
+    """Test that only the most recent last set at the given weight counts."""
+    with ar.open_archive(archive_file) as archive:
+        found = ar.find_top_sets_reps(
+            archive, {"a": ("SQUAT", 100.001), "b": ("SQUAT", 110), "c": ("SQUAT", 20), "d": ("NOPE", 100)}
+        )
+    assert found == {"a": 7, "b": 8, "c": None, "d": None}
+
+
+def test_max_one_rep_max(archive_file: str) -> None:
+    """Test the best e1RM, ignoring sets without weight or reps."""
+    with ar.open_archive(archive_file) as archive:
+        assert ar.max_one_rep_max(archive, "SQUAT") == compute_one_rep_max(110, 8)
+        assert ar.max_one_rep_max(archive, "SQUAT", since=archive.timestamps[2]) == compute_one_rep_max(100, 7)
+        assert ar.max_one_rep_max(archive, "PLANK") is None
+        assert ar.max_one_rep_max(archive, "NOPE") is None
+
+
+def test_matches_workout_search(tmp_path: Path) -> None:
+    """Test that the archive finds the same week 3 top sets as the search over workouts."""
+    athlete = s.make_roster(1)[0]
+    history = s.make_history(athlete, 1)
+    multiplier = TEMPLATE[0][2][-1][0]
+    filename = str(tmp_path / "history.jca")
+    ar.write_archive(history, filename)
+    with ar.open_archive(filename) as archive:
+        expected = m.find_week3_top_sets_reps(athlete, multiplier, history)
+        assert m.find_week3_top_sets_reps_in_archive(athlete, multiplier, archive) == expected
+
+
+def test_not_an_archive(tmp_path: Path) -> None:
+    """Test that other files are rejected."""
+    filename = tmp_path / "config.json"
+    filename.write_text("{" + " " * 100 + "}")
+    with pytest.raises(ValueError), ar.open_archive(str(filename)):
+        pass
+
+
+def test_archive_history_reports_in_the_gym_unit(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """Test that estimated one rep maxes are printed in kg for kg gyms, and in lbs otherwise."""
+    monkeypatch.setattr(h, "get_all_workouts", lambda api_key: WORKOUTS)
+    config = s.make_roster(1)[0]
+    config["squat_exercise_id"] = "SQUAT"
+    orm = compute_one_rep_max(110, 8)
+
+    m._archive_history("key", config, str(tmp_path / "history.jca"), build_table({"unit": "kg", "plates": [20, 10]}))
+    assert f"squat: best estimated 1RM {orm:.1f} kg" in capsys.readouterr().out
+
+    m._archive_history("key", config, str(tmp_path / "history.jca"))
+    assert f"squat: best estimated 1RM {kgs_to_lbs(orm):.1f} lbs" in capsys.readouterr().out
+
+
+def test_archive_history_fetches_every_page(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """Test that the whole history is archived, not just the most recent workouts."""
+    history: list[h.HevyWorkout] = [
+        {
+            "title": "Squat",
+            "is_private": False,
+            "start_time": f"2024-01-01T{i // 60:02d}:{i % 60:02d}:00Z",
+            "end_time": f"2024-01-01T{i // 60:02d}:{i % 60:02d}:30Z",
+            "exercises": [
+                {
+                    "exercise_template_id": "SQUAT",
+                    "notes": "",
+                    # The oldest workout has the best set
+                    "sets": [{"type": "normal", "weight_kg": 150 if i == 0 else 100, "reps": 5}],
+                }
+            ],
+        }
+        for i in reversed(range(300))
+    ]
+    pages = []
+
+    class Session:
+        def get(self, url: str, params: dict[str, int], headers: dict[str, str]) -> requests.Response:
+            page, page_size = params["page"], params["pageSize"]
+            pages.append(page)
+            body = {
+                "page": page,
+                "page_count": math.ceil(len(history) / page_size),
+                "workouts": history[(page - 1) * page_size : page * page_size],
+            }
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps(body).encode()
+            return response
+
+    monkeypatch.setattr(h, "_session", Session)
+    config = s.make_roster(1)[0]
+    config["squat_exercise_id"] = "SQUAT"
+
+    m._archive_history("key", config, str(tmp_path / "history.jca"), build_table({"unit": "kg", "plates": [20, 10]}))
+    out = capsys.readouterr().out
+    assert len(pages) == 300 // h.PAGE_SIZE
+    assert "Archived 300 sets" in out
+    assert f"squat: best estimated 1RM {compute_one_rep_max(150, 5):.1f} kg" in out
@@ -0,0 +1,35 @@
+"""Tests for the benchmark suite helpers."""
+
+import juggy.main as m
+from benchmarks import synthetic as s
+from benchmarks.run import Result, compare
+from juggy.algo import TEMPLATE
+
+
+def test_compare() -> None:
+    """Test that only slowdowns beyond the threshold are regressions."""
+    baseline: dict[str, Result] = {"a": {"best": 1.0, "runs": 5}, "b": {"best": 1.0, "runs": 5}}
+    current: dict[str, Result] = {
+        "a": {"best": 1.1, "runs": 5},
+        "b": {"best": 1.3, "runs": 5},
+        "new": {"best": 9.0, "runs": 5},
+    }
+    assert compare(baseline, current, 0.2) == ["b"]
+    assert compare(baseline, current, 0.05) == ["a", "b"]
+
+
+def test_synthetic_data_is_deterministic() -> None:
+    """Test that the same seed gives the same data."""
+    assert s.make_roster(10, seed=3) == s.make_roster(10, seed=3)
+    assert s.make_roster(10, seed=3) != s.make_roster(10, seed=4)
+
+
+def test_synthetic_history_top_sets_are_oldest() -> None:
+    """Test that the week 3 top sets are found, and only at the very end of the history."""
+    athlete = s.make_roster(1)[0]
+    history = s.make_history(athlete, 1)
+    assert len(history) == 52 * 4
+    multiplier = TEMPLATE[0][2][-1][0]
+    assert m.find_week3_top_sets_reps(athlete, multiplier, history) == m.find_week3_top_sets_reps(
+        athlete, multiplier, history[-4:]
+    )
@@ -0,0 +1,159 @@
+"""Tests for the exercise template catalog."""
+
+import json
+from pathlib import Path
+from typing import cast
+
+import pytest
+import requests
+
+import juggy.catalog as cat
+import juggy.config as c
+import juggy.hevy as h
+
+TEMPLATES: list[h.HevyExerciseTemplate] = [
+    {
+        "id": "D04AC939",
+        "title": "Squat (Barbell)",
+        "type": "weight_reps",
+        "primary_muscle_group": "quadriceps",
+        "secondary_muscle_groups": [],
+        "is_custom": False,
+    },
+    {
+        "id": "79D0BB3A",
+        "title": "Bench Press (Barbell)",
+        "type": "weight_reps",
+        "primary_muscle_group": "chest",
+        "secondary_muscle_groups": [],
+        "is_custom": False,
+    },
+    {
+        "id": "C6272009",
+        "title": "Deadlift (Barbell)",
+        "type": "weight_reps",
+        "primary_muscle_group": "hamstrings",
+        "secondary_muscle_groups": [],
+        "is_custom": False,
+    },
+    {
+        "id": "7B8D84E8",
+        "title": "Overhead Press (Barbell)",
+        "type": "weight_reps",
+        "primary_muscle_group": "shoulders",
+        "secondary_muscle_groups": [],
+        "is_custom": False,
+    },
+]
+
+
+def _config() -> c.Config:
+    return cast(
+        c.Config,
+        {
+            "api_key": "key",
+            "squat_tm": 285,
+            "bench_tm": 220,
+            "deadlift_tm": 430,
+            "ohp_tm": 130,
+            "folder": "Juggy",
+            "squat_exercise_id": "D04AC939",
+            "bench_exercise_id": "79D0BB3A",
+            "deadlift_exercise_id": "C6272009",
+            "ohp_exercise_id": "7B8D84E8",
+        },
+    )
+
+
+def _index() -> cat.CatalogIndex:
+    return cat.build_index({"fetched_at": 0, "downloaded_at": 0, "etag": None, "templates": TEMPLATES})
+
+
+def test_find_by_id_and_name() -> None:
+    """Test exact lookups by ID and by (normalized) title."""
+    index = _index()
+    assert cat.find_by_id(index, "D04AC939") == TEMPLATES[0]
+    assert cat.find_by_id(index, "nope") is None
+    assert cat.find_by_name(index, "  bench   press (BARBELL) ") == [TEMPLATES[1]]
+    assert cat.find_by_name(index, "Bench") == []
+
+
+def test_search() -> None:
+    """Test substring search over titles."""
+    assert [t["id"] for t in cat.search(_index(), "barbell")] == ["D04AC939", "79D0BB3A", "C6272009", "7B8D84E8"]
+    assert cat.search(_index(), "press") == [TEMPLATES[1], TEMPLATES[3]]
+
+
+def test_custom_templates_sharing_a_title() -> None:
+    """Test that a custom template with the title of a built-in one doesn't hide it."""
+    custom: h.HevyExerciseTemplate = {**TEMPLATES[0], "id": "CUSTOM01", "title": "squat (barbell)", "is_custom": True}
+    index = cat.build_index({"fetched_at": 0, "downloaded_at": 0, "etag": None, "templates": [*TEMPLATES, custom]})
+    assert cat.find_by_name(index, "Squat (Barbell)") == [TEMPLATES[0], custom]
+    assert [t["id"] for t in cat.search(index, "squat")] == ["D04AC939", "CUSTOM01"]
+
+
+def test_validate_config() -> None:
+    """Test that unknown main lift and accessory IDs are reported."""
+    config = _config()
+    assert cat.validate_config(config, _index()) == []
+
+    config["ohp_exercise_id"] = "BAD00001"
+    config["bench_accessories"] = [{"exercise_template_id": "BAD00002", "notes": "", "sets": []}]
+    problems = cat.validate_config(config, _index())
+    assert len(problems) == 2
+    assert "BAD00002" in problems[0]
+    assert "BAD00001" in problems[1]
+
+
+def test_sync_catalog_uses_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a fresh cache is used without API calls, and a stale one is revalidated by the downloaded ETag."""
+    filename = str(tmp_path / "catalog.json")
+    downloads = []
+    revalidated: list[str | None] = []
+
+    def get_exercise_templates(api_key: str) -> h.ExerciseTemplates:
+        downloads.append(api_key)
+        return h.ExerciseTemplates(TEMPLATES, f"v{len(downloads)}")
+
+    def exercise_templates_changed(api_key: str, etag: str | None) -> tuple[bool, str | None]:
+        revalidated.append(etag)
+        return etag != "v1", etag
+
+    monkeypatch.setattr(h, "get_exercise_templates", get_exercise_templates)
+    monkeypatch.setattr(h, "exercise_templates_changed", exercise_templates_changed)
+
+    catalog = cat.sync_catalog("key", filename)
+    assert catalog["templates"] == TEMPLATES
+    assert catalog["etag"] == "v1"
+    assert len(downloads) == 1
+
+    cat.sync_catalog("key", filename)
+    assert len(downloads) == 1
+
+    # Stale, but the ETag says nothing changed
+    cat.sync_catalog("key", filename, max_age=0)
+    assert len(downloads) == 1
+    assert revalidated == ["v1"]
+
+    # Downloaded too long ago to trust the ETag of the first page, then forced
+    assert cat.sync_catalog("key", filename, max_age=0, max_download_age=0)["etag"] == "v2"
+    assert cat.sync_catalog("key", filename, force=True)["etag"] == "v3"
+    assert revalidated == ["v1"]
+
+
+def test_get_exercise_templates_keeps_the_etag(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the ETag of the first page is kept from the download, whatever the case of the header."""
+    pages = {1: ("v1", TEMPLATES[:2]), 2: ("v2", TEMPLATES[2:])}
+
+    class Session:
+        def get(self, url: str, params: dict[str, int], headers: dict[str, str]) -> requests.Response:
+            etag, templates = pages[params["page"]]
+            body = {"page": params["page"], "page_count": len(pages), "exercise_templates": templates}
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps(body).encode()
+            response.headers.update({"etag": etag})
+            return response
+
+    monkeypatch.setattr(h, "_session", Session)
+    assert h.get_exercise_templates("key") == (TEMPLATES, "v1")
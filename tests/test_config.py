@@ -0,0 +1,38 @@
+"""Tests for loading configs and rosters."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+import juggy.config as c
+
+
+def _write_roster(path: Path, athletes: list[dict[str, str]]) -> str:
+    path.write_text("".join(json.dumps(athlete) + "\n" for athlete in athletes) + "\n")
+    return str(path)
+
+
+def test_load_roster(tmp_path: Path) -> None:
+    """Test that athletes are loaded in order, skipping blank lines."""
+    roster = _write_roster(
+        tmp_path / "roster.jsonl", [{"name": "a", "folder": "Juggy"}, {"name": "b", "folder": "Juggy"}]
+    )
+    assert [c.athlete_name(athlete) for athlete in c.load_roster(roster)] == ["a", "b"]
+
+
+@pytest.mark.parametrize(
+    ("athletes", "error"),
+    [
+        ([{"name": "a", "folder": "Juggy"}, {"folder": "Juggy"}], "roster.jsonl:2: athlete has no name"),
+        (
+            [{"name": "a", "folder": "Juggy"}, {"name": "a", "folder": "Juggy"}],
+            "roster.jsonl:2: .* 'a' is already taken",
+        ),
+    ],
+)
+def test_load_roster_requires_unique_names(tmp_path: Path, athletes: list[dict[str, str]], error: str) -> None:
+    """Test that athletes without a name, or with one already taken, are rejected rather than mixed up."""
+    roster = _write_roster(tmp_path / "roster.jsonl", athletes)
+    with pytest.raises(ValueError, match=error):
+        list(c.load_roster(roster))
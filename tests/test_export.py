@@ -0,0 +1,114 @@
+"""Tests for program exports."""
+
+import csv
+import io
+import json
+import sys
+from collections.abc import Iterator
+from datetime import date
+from typing import cast
+
+import pytest
+
+import juggy.config as c
+import juggy.main as m
+from juggy.export import DAY_OFFSETS, _ics_line, export, iter_sessions
+
+
+def _athlete(name: str, squat_tm: float = 285) -> c.Config:
+    return cast(
+        c.Config,
+        {
+            "name": name,
+            "squat_tm": squat_tm,
+            "bench_tm": 220,
+            "deadlift_tm": 430,
+            "ohp_tm": 130,
+            "folder": "Juggy",
+            "squat_exercise_id": "D04AC939",
+            "bench_exercise_id": "79D0BB3A",
+            "deadlift_exercise_id": "C6272009",
+            "ohp_exercise_id": "7B8D84E8",
+        },
+    )
+
+
+def test_iter_sessions() -> None:
+    """Test that sessions are generated per athlete, week and lift, in order."""
+    sessions = list(iter_sessions([_athlete("a"), _athlete("b")], [1], [2, 3]))
+    assert len(sessions) == 2 * 2 * 4
+    assert [s["lift"] for s in sessions[:4]] == ["squat", "bench", "deadlift", "ohp"]
+    assert [s["schedule_week"] for s in sessions[:8]] == [0, 0, 0, 0, 1, 1, 1, 1]
+    assert sessions[8]["athlete"] == "b"
+
+    squat = sessions[4]
+    assert (squat["wave"], squat["week"]) == (1, 3)
+    assert [(s["type"], s["weight"], s["reps"]) for s in squat["sets"]][-2:] == [
+        ("normal", 200, 1),
+        ("normal", 215, 10),
+    ]
+    assert squat["sets"][0]["weight_kg"] == 20.41
+
+
+def test_iter_sessions_is_lazy() -> None:
+    """Test that athletes are consumed one at a time, as sessions are requested."""
+    consumed = []
+
+    def athletes() -> Iterator[c.Config]:
+        for name in ["a", "b"]:
+            consumed.append(name)
+            yield _athlete(name)
+
+    sessions = iter_sessions(athletes(), [1], [1])
+    next(sessions)
+    assert consumed == ["a"]
+
+
+def test_export_csv() -> None:
+    """Test that CSV has one row per set."""
+    file = io.StringIO()
+    count = export(iter_sessions([_athlete("a")], [1], [3]), "csv", file)
+    rows = list(csv.DictReader(io.StringIO(file.getvalue())))
+    assert count == 4
+    assert len(rows) == 4 * 8
+    assert rows[0]["athlete"] == "a"
+    assert rows[-1]["lift"] == "ohp"
+
+
+def test_export_jsonl() -> None:
+    """Test that JSON Lines has one object per session."""
+    file = io.StringIO()
+    export(iter_sessions([_athlete("a")], [1, 2], [1]), "jsonl", file)
+    lines = file.getvalue().splitlines()
+    assert len(lines) == 8
+    assert json.loads(lines[-1])["wave"] == 2
+
+
+def test_export_ics() -> None:
+    """Test that sessions are laid out on the calendar from the start date."""
+    file = io.StringIO()
+    export(iter_sessions([_athlete("a")], [1], [1, 2]), "ics", file, date(2025, 1, 6))
+    text = file.getvalue()
+    assert text.startswith("BEGIN:VCALENDAR\r\n")
+    assert text.endswith("END:VCALENDAR\r\n")
+    assert text.count("BEGIN:VEVENT") == 8
+    assert "DTSTART;VALUE=DATE:20250106" in text
+    assert f"DTSTART;VALUE=DATE:{20250113 + DAY_OFFSETS['ohp']}" in text
+
+
+def test_ics_line_folding() -> None:
+    """Test that long lines are folded at 75 octets."""
+    folded = _ics_line("DESCRIPTION:" + "x" * 200)
+    lines = folded.removesuffix("\r\n").split("\r\n")
+    assert all(len(line.encode()) <= 75 for line in lines)
+    assert "".join(line.removeprefix(" ") for line in lines) == "DESCRIPTION:" + "x" * 200
+
+
+def test_export_rejects_unknown_weeks(monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test that a wave or week outside the cycle is a usage error, not a crash."""
+    for option in ["--wave", "--week"]:
+        monkeypatch.setattr(sys, "argv", ["juggy", "-c", "export", option, "5"])
+        with pytest.raises(SystemExit) as exited:
+            m.main()
+        assert exited.value.code == 2
+        assert f"argument {option}: invalid choice: 5" in capsys.readouterr().err
@@ -0,0 +1,104 @@
+"""Tests for the Hevy API helpers."""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import pytest
+
+import juggy.hevy as h
+
+
+def _routine(routine_id: Any, title: str = "Accessories") -> h.HevyRoutine:
+    return {
+        "id": routine_id,
+        "title": title,
+        "notes": "",
+        "folder_id": 1,
+        "exercises": [
+            {
+                "index": 0,
+                "title": "Lat Pulldown (Cable)",
+                "exercise_template_id": "6A6C31A5",
+                "notes": "",
+                "sets": [{"index": 0, "type": "normal", "weight_kg": 50, "reps": 10}],
+            }
+        ],
+    }
+
+
+def test_find_routine_by_id_compares_as_strings() -> None:
+    """Test that ids given on the command line match ids returned by the API."""
+    routines = [_routine(1), _routine(42)]
+    assert h.find_routine_by_id("42", routines) == routines[1]
+    assert h.find_routine_by_id(42, routines) == routines[1]
+    assert h.find_routine_by_id("7", routines) is None
+
+
+def test_tidy_exercises_does_not_mutate() -> None:
+    """Test that tidying returns clean copies and leaves the routine intact."""
+    routine = _routine(1)
+    tidied = h.tidy_exercises(routine["exercises"])
+    assert tidied == [
+        {
+            "exercise_template_id": "6A6C31A5",
+            "notes": "",
+            "sets": [{"type": "normal", "weight_kg": 50, "reps": 10}],
+        }
+    ]
+    assert routine["exercises"][0]["index"] == 0
+    assert routine["exercises"][0]["sets"][0]["index"] == 0
+
+
+def test_get_exercises_from_routine() -> None:
+    """Test the lookup with a string id, and that it can be repeated."""
+    routines = [_routine(42)]
+    first = h.get_exercises_from_routine("42", routines)
+    assert first and first[0]["exercise_template_id"] == "6A6C31A5"
+    assert h.get_exercises_from_routine("42", routines) == first
+    assert h.get_exercises_from_routine(None, routines) is None
+
+
+def test_get_routines_by_id_falls_back_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that routines that can't be fetched directly are found in a single fetch of the routine list."""
+    listings = []
+
+    def get_routine(api_key: str, routine_id: str) -> h.HevyRoutine | None:
+        if routine_id == "broken":
+            raise RuntimeError("Request failed with status code 500")
+        return _routine(routine_id) if routine_id.startswith("direct") else None
+
+    def get_routines(api_key: str) -> list[h.HevyRoutine]:
+        listings.append(api_key)
+        return [_routine("listed"), _routine("broken")]
+
+    monkeypatch.setattr(h, "get_routine", get_routine)
+    monkeypatch.setattr(h, "get_routines", get_routines)
+
+    results = h.get_routines_by_id("key", ["direct-1", "direct-2", "listed", "broken", "missing"])
+    assert {k: v["id"] if v else None for k, v in results.items()} == {
+        "direct-1": "direct-1",
+        "direct-2": "direct-2",
+        "listed": "listed",
+        "broken": "broken",
+        "missing": None,
+    }
+    assert listings == ["key"]
+
+
+def test_get_routines_by_id_skips_listing(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the routine list isn't fetched when every routine was fetched directly."""
+    monkeypatch.setattr(h, "get_routine", lambda api_key, routine_id: _routine(routine_id))
+
+    def get_routines(api_key: str) -> list[h.HevyRoutine]:
+        raise AssertionError("Should not list routines")
+
+    monkeypatch.setattr(h, "get_routines", get_routines)
+    assert len(h.get_routines_by_id("key", ["a", "b", "c", "d"])) == 4
+
+
+def test_sessions_are_per_thread() -> None:
+    """Test that a thread reuses its session, and threads never share one."""
+    assert h._session() is h._session()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        sessions = list(pool.map(lambda _: h._session(), range(2)))
+    assert h._session() not in sessions
@@ -0,0 +1,174 @@
+"""Tests for the job queue."""
+
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import cast
+
+import pytest
+
+import juggy.catalog as cat
+import juggy.config as c
+import juggy.hevy as h
+import juggy.jobs as j
+import juggy.main as m
+from benchmarks import synthetic as s
+
+
+def _athlete(name: str, api_key: str) -> c.Config:
+    return cast(c.Config, {"name": name, "api_key": api_key, "folder": "Juggy"})
+
+
+def test_enqueue_is_idempotent(tmp_path: Path) -> None:
+    """Test that queueing the same week again doesn't duplicate jobs."""
+    conn = j.connect(str(tmp_path / "jobs.db"))
+    athletes = [_athlete("a", "key-a"), _athlete("b", "key-b")]
+    assert j.enqueue(conn, athletes, 1, 1) == 2
+    assert j.enqueue(conn, athletes, 1, 1) == 0
+    assert j.enqueue(conn, athletes, 1, 2) == 2
+    assert j.status(conn) == {"pending": 4}
+
+
+def test_claim_locks_accounts(tmp_path: Path) -> None:
+    """Test that a job isn't claimed while another job of the same account is running."""
+    conn = j.connect(str(tmp_path / "jobs.db"))
+    j.enqueue(conn, [_athlete("a", "shared"), _athlete("b", "shared"), _athlete("c", "other")], 1, 1)
+
+    first = j.claim(conn)
+    second = j.claim(conn)
+    assert first and first["athlete"] == "a"
+    assert first["account"] == j.account_id(_athlete("a", "shared"))
+    assert second and second["athlete"] == "c"
+    assert j.claim(conn) is None
+
+    j.finish(conn, first["id"])
+    third = j.claim(conn)
+    assert third and third["athlete"] == "b"
+
+
+def test_failed_jobs_are_retried(tmp_path: Path) -> None:
+    """Test that failed jobs are claimed again until they run out of attempts."""
+    conn = j.connect(str(tmp_path / "jobs.db"))
+    j.enqueue(conn, [_athlete("a", "key-a")], 1, 1)
+    for attempt in range(1, 3):
+        job = j.claim(conn, max_attempts=2)
+        assert job and job["attempts"] == attempt
+        j.finish(conn, job["id"], "boom")
+    assert j.claim(conn, max_attempts=2) is None
+    assert not j.has_work(conn, max_attempts=2)
+
+
+def test_recover(tmp_path: Path) -> None:
+    """Test that jobs left running by a dead worker become pending again once stale."""
+    conn = j.connect(str(tmp_path / "jobs.db"))
+    j.enqueue(conn, [_athlete("a", "key-a")], 1, 1)
+    j.claim(conn)
+    assert j.recover(conn, stale_seconds=60) == 0
+    assert j.recover(conn, stale_seconds=-1) == 1
+    assert j.status(conn) == {"pending": 1}
+
+
+def test_work(tmp_path: Path) -> None:
+    """Test that the pool drains the queue, retries failures, and a restart skips completed jobs."""
+    filename = str(tmp_path / "jobs.db")
+    conn = j.connect(filename)
+    athletes = [_athlete(f"athlete-{i}", f"key-{i % 3}") for i in range(12)]
+    j.enqueue(conn, athletes, 2, 3)
+
+    lock = threading.Lock()
+    running: set[str] = set()
+    runs: list[str] = []
+    overlaps = []
+
+    def handler(job: j.Job) -> None:
+        with lock:
+            if job["account"] in running:
+                overlaps.append(job["athlete"])
+            running.add(job["account"])
+            runs.append(job["athlete"])
+        try:
+            if job["athlete"] == "athlete-5" and job["attempts"] == 1:
+                raise RuntimeError("API error")
+        finally:
+            with lock:
+                running.discard(job["account"])
+
+    assert j.work(handler, filename, workers=4) == {"done": 12}
+    assert len(runs) == 13
+    assert runs.count("athlete-5") == 2
+    assert overlaps == []
+
+    runs.clear()
+    assert j.work(handler, filename, workers=4) == {"done": 12}
+    assert runs == []
+
+
+def test_work_recovers_jobs_of_a_dead_worker(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a job claimed by a worker that just died is run once stale, while a live slow job is left alone."""
+    monkeypatch.setattr(j, "POLL_SECONDS", 0.01)
+    monkeypatch.setattr(j, "HEARTBEAT_SECONDS", 0.05)
+    filename = str(tmp_path / "jobs.db")
+    conn = j.connect(filename)
+    j.enqueue(conn, [_athlete("dead", "key-a"), _athlete("slow", "key-b")], 1, 1)
+    assert j.claim(conn)
+
+    runs: list[str] = []
+
+    def handler(job: j.Job) -> None:
+        runs.append(job["athlete"])
+        if job["athlete"] == "slow":
+            time.sleep(0.5)
+
+    assert j.work(handler, filename, workers=2, stale_seconds=0.2) == {"done": 2}
+    assert sorted(runs) == ["dead", "slow"]
+
+
+def test_enqueue_rejects_a_name_taken_by_another_account(tmp_path: Path) -> None:
+    """Test that an athlete isn't silently dropped because another account's athlete has the same name."""
+    conn = j.connect(str(tmp_path / "jobs.db"))
+    j.enqueue(conn, [_athlete("a", "key-a")], 1, 1)
+    with pytest.raises(ValueError, match="'a'"):
+        j.enqueue(conn, [_athlete("b", "key-b"), _athlete("a", "key-c")], 1, 1)
+    assert j.status(conn) == {"pending": 1}
+
+
+def test_work_reads_athletes_from_the_roster(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that jobs run with the roster as it is when worked, and athletes with unknown exercise IDs, or no longer in
+    the roster, fail once without writes.  The catalog is synced once, and API keys are never stored."""
+    filename = str(tmp_path / "jobs.db")
+    athletes = s.make_roster(4)
+    with closing(j.connect(filename)) as conn:
+        j.enqueue(conn, athletes, 1, 1)
+    athletes[1]["ohp_exercise_id"] = "BAD00001"
+    athletes[2]["squat_tm"] = 500
+
+    templates = [
+        cast(h.HevyExerciseTemplate, {"id": exercise_id, "title": lift}) for lift, exercise_id in s.EXERCISE_IDS.items()
+    ]
+    syncs = []
+    setups = []
+
+    def sync_catalog(api_key: str, filename: str) -> cat.ExerciseCatalog:
+        syncs.append(api_key)
+        return {"fetched_at": 0, "downloaded_at": 0, "etag": None, "templates": templates}
+
+    def setup_week(api_key: str, config: c.Config, wave: int, week: int, table: object) -> None:
+        setups.append((config["name"], config["squat_tm"]))
+
+    monkeypatch.setattr(cat, "sync_catalog", sync_catalog)
+    monkeypatch.setattr(m, "_setup_week", setup_week)
+    m._work(filename, 2, 3, None, "catalog.json", athletes[:3])
+
+    assert sorted(setups) == [("athlete-0", athletes[0]["squat_tm"]), ("athlete-2", 500)]
+    assert len(syncs) == 1
+    with closing(j.connect(filename)) as conn:
+        assert j.status(conn) == {"done": 2, "failed": 2}
+        failed = conn.execute(
+            "SELECT athlete, attempts, error FROM jobs WHERE status = 'failed' ORDER BY id"
+        ).fetchall()
+    # No attempts left, so they are never claimed again
+    assert [row["attempts"] for row in failed] == [3, 3]
+    assert "BAD00001" in failed[0]["error"]
+    assert failed[1]["error"] == "athlete-3 is not in the roster"
+    assert b"key-0" not in Path(filename).read_bytes()
@@ -0,0 +1,64 @@
+"""Tests for loading rules."""
+
+import pytest
+
+from juggy.loading import LoadingRules, build_table, snap_weight
+
+KG_GYM: LoadingRules = {"unit": "kg", "plates": [20, 20, 10, 5, 2.5, 1.25]}
+
+
+def test_build_table() -> None:
+    """Test that the table holds every achievable load, sorted and without duplicates."""
+    table = build_table({"unit": "lb", "plates": [45, 25, 10, 5]})
+    assert table.loads[0] == 45
+    assert table.loads[-1] == 45 + 2 * (45 + 25 + 10 + 5)
+    assert 95 in table.loads  # 25 + 0
+    assert 50 not in table.loads  # would need 2.5 lbs plates
+    assert list(table.loads) == sorted(set(table.loads))
+
+
+def test_build_table_is_cached() -> None:
+    """Test that equivalent rules share one precomputed table."""
+    assert build_table(KG_GYM) is build_table({"unit": "kg", "plates": [1.25, 2.5, 5, 10, 20, 20]})
+
+
+def test_build_table_defaults() -> None:
+    """Test the default bar, rounding and warmup starts."""
+    table = build_table(KG_GYM)
+    assert table.loads[0] == 20
+    assert table.rounding == "ceil"
+    assert table.warmup_start == 20
+    assert table.deadlift_warmup_start == 30
+
+
+@pytest.mark.parametrize(
+    "rounding,weight,expected",
+    [
+        ("ceil", 101.1, 102.5),
+        ("floor", 101.1, 100.0),
+        ("nearest", 101.1, 100.0),
+        ("nearest", 101.3, 102.5),
+        ("nearest", 101.25, 102.5),  # Ties go up
+        ("ceil", 100.0, 100.0),
+        ("floor", 10.0, 20.0),  # Clamped to the empty bar
+        ("ceil", 500.0, 137.5),  # Clamped to everything loaded
+    ],
+)
+def test_snap_weight(rounding: str, weight: float, expected: float) -> None:
+    """Test snapping to achievable loads with each rounding mode."""
+    table = build_table({**KG_GYM, "rounding": rounding})  # type: ignore
+    assert snap_weight(table, weight) == expected
+
+
+@pytest.mark.parametrize(
+    "rules",
+    [
+        {"unit": "stone", "plates": [10]},
+        {"unit": "kg", "plates": [10], "rounding": "up"},
+        {"unit": "kg", "plates": [10, 0]},
+    ],
+)
+def test_build_table_invalid(rules: LoadingRules) -> None:
+    """Test that invalid rules are rejected."""
+    with pytest.raises(ValueError):
+        build_table(rules)
@@ -0,0 +1,121 @@
+"""Tests for structured logging."""
+
+import io
+import json
+from collections.abc import Iterator
+from pathlib import Path
+from typing import cast
+
+import pytest
+import requests
+from loguru import logger
+
+import juggy.config as c
+import juggy.hevy as h
+import juggy.jobs as j
+import juggy.log as lg
+
+
+@pytest.fixture
+def stream() -> Iterator[io.StringIO]:
+    stream = io.StringIO()
+    yield stream
+    lg.reset()
+
+
+class Explosive:
+    def __format__(self, format_spec: str) -> str:
+        raise AssertionError("formatted")
+
+    def __repr__(self) -> str:
+        raise AssertionError("formatted")
+
+
+def test_records_below_the_level_are_not_formatted(stream: io.StringIO) -> None:
+    """Test that neither the message nor the fields of a filtered record are formatted."""
+    lg.setup("INFO", "json", stream)
+    logger.debug("Routine {routine_id}", routine_id=Explosive(), routine=Explosive())
+    assert stream.getvalue() == ""
+
+
+def test_json_records(stream: io.StringIO) -> None:
+    """Test that records are JSON with their fields, secrets redacted and large fields capped."""
+    lg.setup("DEBUG", "json", stream)
+    routine = {"id": 42, "notes": "x" * 2000}
+    logger.debug(
+        "Routine {routine_id}",
+        routine_id=42,
+        routine=routine,
+        config={"folder": "Juggy", "api_key": "secret"},
+        api_key="secret",
+    )
+    record = json.loads(stream.getvalue())
+    assert record["level"] == "DEBUG"
+    assert record["message"] == "Routine 42"
+    assert record["routine_id"] == 42
+    assert record["config"] == {"folder": "Juggy", "api_key": lg.REDACTED}
+    assert record["api_key"] == lg.REDACTED
+    assert record["routine"].startswith('{"id":42,"notes":"xxx')
+    assert record["routine"].endswith(f"... ({len(json.dumps(routine, separators=(',', ':'))) - 1000} more characters)")
+    assert "secret" not in stream.getvalue()
+
+
+def test_text_records(stream: io.StringIO) -> None:
+    """Test that text records show their fields, redacted."""
+    lg.setup("INFO", "text", stream)
+    logger.info("Creating routine {title}", title="Squat Day", api_key="secret")
+    line = stream.getvalue()
+    assert "Creating routine Squat Day" in line
+    assert "'title': 'Squat Day'" in line
+    assert "secret" not in line
+
+
+def test_reset(stream: io.StringIO) -> None:
+    """Test that records are left alone once logging is reset."""
+    lg.setup("INFO", "json", stream)
+    lg.reset()
+    handler = logger.add(stream, format="{extra}")
+    try:
+        logger.info("Key", api_key="secret")
+    finally:
+        logger.remove(handler)
+    assert "secret" in stream.getvalue()
+
+
+def test_sample() -> None:
+    """Test that the first occurrence of an event is logged, then one in every."""
+    assert [lg.sample("test_sample", 3) for _ in range(7)] == [True, False, False, True, False, False, True]
+
+
+def test_get_exercises_from_routine_logs_lazily(stream: io.StringIO) -> None:
+    """Test that the routine is only serialized when debug logs are emitted."""
+    routine: h.HevyRoutine = {"id": 1, "title": "Accessories", "notes": "", "folder_id": 1, "exercises": []}
+    lg.setup("INFO", "json", stream)
+    assert h.get_exercises_from_routine("1", [routine]) == []
+    assert stream.getvalue() == ""
+
+    lg.setup("DEBUG", "json", stream)
+    h.get_exercises_from_routine("1", [routine])
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert records[0]["routine"] == routine
+
+
+def test_errors_stay_out_of_the_message(stream: io.StringIO, tmp_path: Path) -> None:
+    """Test that a failed job's error, an oversized API response here, is a capped field and not in the message."""
+    lg.setup("INFO", "json", stream)
+    conn = j.connect(str(tmp_path / "jobs.db"))
+    j.enqueue(conn, [cast(c.Config, {"name": "a", "api_key": "key", "folder": "Juggy"})], 1, 1)
+    response = requests.Response()
+    response.status_code = 500
+    response._content = ("x" * 5000).encode()
+
+    def handler(job: j.Job) -> None:
+        h._raise_for_status(response)
+
+    j.work(handler, str(tmp_path / "jobs.db"), workers=1, max_attempts=1)
+    [failed] = [json.loads(line) for line in stream.getvalue().splitlines() if '"ERROR"' in line]
+    assert failed["message"] == "Failed a wave 1 week 1"
+    assert "xxx" in failed["error"]
+    assert len(failed["error"]) < 2 * lg.MAX_FIELD_CHARS
+    stored = conn.execute("SELECT error FROM jobs").fetchone()["error"]
+    assert len(stored) < 2 * lg.MAX_FIELD_CHARS
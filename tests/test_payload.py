@@ -0,0 +1,68 @@
+"""Tests for the routine payload builder."""
+
+import json
+
+import juggy.hevy as h
+from juggy.algo import TEMPLATE
+from juggy.loading import build_table
+from juggy.payload import (
+    build_exercise,
+    generate_sets,
+    merge_accessories,
+    routine_digest,
+    serialize_routine,
+)
+
+
+def test_generate_sets_is_memoized() -> None:
+    """Test that the same inputs return the very same (immutable) set list."""
+    protocol = tuple(TEMPLATE[0][2])
+    first = generate_sets(protocol, 285, 5, False)
+    assert generate_sets(protocol, 285, 5, False) is first
+    assert generate_sets(protocol, 285, 5, True) is not first
+    assert [reps for _, _, reps in first] == [10, 5, 3, 2, 5, 3, 1, 10]
+
+
+def test_build_exercise_returns_independent_copies() -> None:
+    """Test that mutating a built exercise doesn't affect the next one built from the cache."""
+    exercise = build_exercise("D04AC939", TEMPLATE[0][2], 285, notes="Wave 1, Week 3")
+    exercise["sets"][0]["reps"] = 99
+    exercise["sets"].clear()
+
+    again = build_exercise("D04AC939", TEMPLATE[0][2], 285, notes="Wave 1, Week 3")
+    assert len(again["sets"]) == 8
+    assert again["sets"][0]["reps"] == 10
+
+
+def test_serialize_routine() -> None:
+    """Test the payload bodies, and that the inputs are left untouched."""
+    exercises = [build_exercise("D04AC939", TEMPLATE[0][2], 285)]
+    accessories: list[h.HevyExercise] = [{"exercise_template_id": "ABC", "notes": "", "sets": []}]
+    payload = serialize_routine("Squat Day", 42, merge_accessories("Squat Day", exercises, accessories))
+
+    assert len(exercises) == 1
+    assert len(accessories) == 1
+
+    create = json.loads(payload.create_body)["routine"]
+    update = json.loads(payload.update_body)["routine"]
+    assert create["folder_id"] == 42
+    assert "folder_id" not in update
+    assert [e["exercise_template_id"] for e in update["exercises"]] == ["D04AC939", "ABC"]
+
+
+def test_payload_is_deterministic() -> None:
+    """Test that equal routines serialize identically, regardless of key order."""
+    exercise = build_exercise("D04AC939", TEMPLATE[1][0], 300)
+    reordered: h.HevyExercise = {"sets": exercise["sets"], "notes": "", "exercise_template_id": "D04AC939"}
+    first = serialize_routine("Squat Day", 1, [exercise])
+    second = serialize_routine("Squat Day", 2, [reordered])
+    assert first.update_body == second.update_body
+    assert routine_digest("Squat Day", [exercise]) == routine_digest("Squat Day", [reordered])
+    assert first.create_body != second.create_body
+
+
+def test_generate_sets_in_kgs() -> None:
+    """Test that sets generated for a kg gym are sent as is, without conversion."""
+    table = build_table({"unit": "kg", "plates": [20, 20, 10, 5, 2.5, 1.25]})
+    sets = generate_sets(tuple(TEMPLATE[0][2]), 130, 5, False, table)
+    assert sets[-1] == ("normal", 97.5, 10)
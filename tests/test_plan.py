@@ -0,0 +1,130 @@
+"""Tests for API operation planning."""
+
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+import juggy.hevy as h
+from juggy.algo import TEMPLATE
+from juggy.payload import build_exercise
+from juggy.plan import (
+    SavedPlan,
+    apply_plan,
+    build_plan,
+    execute_plan,
+    load_plan,
+    save_plan,
+    summarize,
+    validate_plan,
+)
+
+SQUATS = [build_exercise("D04AC939", TEMPLATE[0][2], 285, notes="Wave 1, Week 3")]
+BENCH = [build_exercise("79D0BB3A", TEMPLATE[0][2], 220, notes="Wave 1, Week 3")]
+WANTED = [("Squat Day", SQUATS), ("Bench Day", BENCH)]
+
+
+def _as_returned_by_api(routine_id: int, title: str, exercises: list[h.HevyExercise]) -> h.HevyRoutine:
+    """Mimic a routine returned by the API: extra fields, and weights not returned bit for bit."""
+    returned: list[Any] = []
+    for i, exercise in enumerate(exercises):
+        sets = [{**s, "index": j, "weight_kg": round(s["weight_kg"], 3)} for j, s in enumerate(exercise["sets"])]
+        returned.append({**exercise, "index": i, "title": "Squat (Barbell)", "sets": sets})
+    return {"id": routine_id, "title": title, "notes": "", "folder_id": 1, "exercises": returned}
+
+
+def test_build_plan_new_folder() -> None:
+    """Test that everything is created when the folder doesn't exist."""
+    plan = build_plan([{"id": 2, "title": "Other"}], [], "Juggy", WANTED)
+    assert [op["action"] for op in plan] == ["create_folder", "create_routine", "create_routine"]
+    assert all(op["folder_id"] is None for op in plan)
+
+
+def test_build_plan_existing_folder() -> None:
+    """Test that unchanged routines are no-ops, changed ones updates and missing ones creations."""
+    routines = [
+        _as_returned_by_api(10, "Squat Day", SQUATS),
+        _as_returned_by_api(11, "Bench Day", SQUATS),
+    ]
+    plan = build_plan([{"id": 1, "title": "Juggy"}], routines, "Juggy", [*WANTED, ("OHP Day", BENCH)])
+    assert [(op["action"], op["routine_id"]) for op in plan] == [
+        ("noop", 10),
+        ("update_routine", 11),
+        ("create_routine", None),
+    ]
+    assert summarize(plan) == {"noop": 1, "update_routine": 1, "create_routine": 1}
+    # No-ops are detected by digest, which ignores what the API adds to routines
+    assert [op["digest"] == op["base"] for op in plan] == [True, False, False]
+
+
+def test_execute_plan(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that routines planned into a new folder are created in it, and no-ops send nothing."""
+    calls: list[tuple] = []
+
+    def create_folder(api_key: str, title: str) -> h.HevyRoutineFolder:
+        calls.append(("folder", title))
+        return {"id": 7, "title": title}
+
+    monkeypatch.setattr(h, "create_folder", create_folder)
+    monkeypatch.setattr(h, "create_routine", lambda api_key, body: calls.append(("create", json.loads(body))))
+    monkeypatch.setattr(h, "update_routine", lambda api_key, id, body: calls.append(("update", id)))
+
+    plan = build_plan([], [], "Juggy", WANTED)
+    plan[2]["action"] = "noop"
+    execute_plan("key", plan)
+
+    assert calls[0] == ("folder", "Juggy")
+    assert calls[1][0] == "create"
+    assert calls[1][1]["routine"]["folder_id"] == 7
+    assert calls[1][1]["routine"]["title"] == "Squat Day"
+    assert len(calls) == 2
+
+
+def test_save_and_load_plan(tmp_path: Path) -> None:
+    """Test that a plan survives a round trip to disk."""
+    saved: SavedPlan = {"account": h.account_id("key"), "operations": build_plan([], [], "Juggy", WANTED)}
+    filename = str(tmp_path / "plan.json")
+    save_plan(saved, filename)
+    assert load_plan(filename) == saved
+
+
+def test_validate_plan() -> None:
+    """Test that operations are checked against what changed in the account since the plan was made."""
+    folders: list[h.HevyRoutineFolder] = [{"id": 1, "title": "Juggy"}]
+    routines = [_as_returned_by_api(10, "Squat Day", SQUATS), _as_returned_by_api(11, "Bench Day", SQUATS)]
+    plan = build_plan(folders, routines, "Juggy", [*WANTED, ("OHP Day", BENCH)])
+    assert validate_plan(plan, folders, routines) == []
+
+    edited = _as_returned_by_api(11, "Bench Day", BENCH)
+    created = _as_returned_by_api(12, "OHP Day", BENCH)
+    assert validate_plan(plan, folders, [edited, created]) == [
+        "Routine Squat Day was deleted since",
+        "Routine Bench Day was changed since",
+        "Routine OHP Day was created since",
+    ]
+    assert validate_plan(build_plan([], [], "Juggy", WANTED), folders, []) == ["Folder Juggy was created since"]
+
+
+def test_apply_plan(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a saved plan is only executed for its account, and while the account is as planned."""
+    folders: list[h.HevyRoutineFolder] = [{"id": 1, "title": "Juggy"}]
+    routines = [_as_returned_by_api(10, "Squat Day", SQUATS)]
+    saved: SavedPlan = {"account": h.account_id("key"), "operations": build_plan(folders, routines, "Juggy", WANTED)}
+    updates: list[int] = []
+    monkeypatch.setattr(h, "get_folders", lambda api_key: folders)
+    monkeypatch.setattr(h, "get_routines", lambda api_key: routines)
+    monkeypatch.setattr(h, "create_routine", lambda api_key, body: updates.append(0))
+    monkeypatch.setattr(h, "update_routine", lambda api_key, id, body: updates.append(id))
+
+    with pytest.raises(RuntimeError, match="another account"):
+        apply_plan("other-key", saved)
+    routines[0]["exercises"][0]["sets"][-1]["reps"] = 1
+    with pytest.raises(RuntimeError, match="Routine Squat Day was changed since"):
+        apply_plan("key", saved)
+    assert updates == []
+
+    routines[0] = _as_returned_by_api(10, "Squat Day", BENCH)
+    saved["operations"] = build_plan(folders, routines, "Juggy", WANTED)
+    apply_plan("key", saved)
+    assert updates == [10, 0]
@@ -0,0 +1,221 @@
+"""Tests for watching for new top sets, against a local stub of the Hevy API."""
+
+import builtins
+import json
+import threading
+from collections.abc import Iterator
+from contextlib import closing
+from datetime import UTC, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import cast
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import juggy.algo as a
+import juggy.config as c
+import juggy.hevy as h
+import juggy.main as m
+import juggy.payload as p
+import juggy.watch as w
+
+START = datetime(2025, 1, 6, 7, tzinfo=UTC)
+
+
+class StubApi:
+    """Serves GET /v1/workouts, newest first and paged like the Hevy API, from per API key workout lists."""
+
+    def __init__(self) -> None:
+        self.workouts: dict[str, list[h.HevyWorkout]] = {}
+        self.requests: list[tuple[str, int]] = []
+
+    def log(self, api_key: str, exercise: h.HevyExercise | None = None, day: datetime | None = None) -> None:
+        """Log a workout with a single exercise, by default a day after the previous one."""
+        workouts = self.workouts.setdefault(api_key, [])
+        day = day or START + timedelta(days=len(workouts))
+        workout: h.HevyWorkout = {
+            "id": f"{api_key}-{len(workouts)}",
+            "title": "Workout",
+            "is_private": False,
+            "start_time": day.isoformat(),
+            "end_time": (day + timedelta(hours=1)).isoformat(),
+            "exercises": [
+                exercise
+                or {
+                    "exercise_template_id": "ACC00001",
+                    "notes": "",
+                    "sets": [{"type": "normal", "weight_kg": 20.0, "reps": 12}],
+                }
+            ],
+        }
+        workouts.append(workout)
+        workouts.sort(key=lambda workout: workout["start_time"], reverse=True)
+
+
+@pytest.fixture
+def api(monkeypatch: pytest.MonkeyPatch) -> Iterator[StubApi]:
+    stub = StubApi()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            api_key = self.headers["api-key"]
+            page, page_size = int(query["page"][0]), int(query["pageSize"][0])
+            stub.requests.append((api_key, page))
+            workouts = stub.workouts.get(api_key, [])
+            page_count = max(1, -(-len(workouts) // page_size))
+            body = json.dumps(
+                {
+                    "page": page,
+                    "page_count": page_count,
+                    "workouts": workouts[(page - 1) * page_size : page * page_size],
+                }
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: object) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(h, "BASE_URL", f"http://127.0.0.1:{server.server_port}/")
+    try:
+        yield stub
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _athlete(name: str, api_key: str, squat_tm: float = 300) -> c.Config:
+    return cast(
+        c.Config,
+        {
+            "name": name,
+            "api_key": api_key,
+            "folder": "Juggy",
+            "squat_tm": squat_tm,
+            "bench_tm": 200,
+            "deadlift_tm": 400,
+            "ohp_tm": 120,
+            "squat_exercise_id": "D04AC939",
+            "bench_exercise_id": "79D0BB3A",
+            "deadlift_exercise_id": "C6272009",
+            "ohp_exercise_id": "7B8D84E8",
+        },
+    )
+
+
+def _lifted(exercise_id: str, wave: int, week: int, training_max: float, top_set_reps: int) -> h.HevyExercise:
+    """An exercise logged as programmed, with the given reps on the top set."""
+    exercise = p.build_exercise(exercise_id, a.TEMPLATE[wave - 1][week - 1], training_max)
+    exercise["sets"][-1]["reps"] = top_set_reps
+    return exercise
+
+
+def test_get_workouts_since_stops_at_cursor(api: StubApi) -> None:
+    """Test that only the pages up to the cursor are fetched, and only workouts from the cursor on returned."""
+    for _ in range(25):
+        api.log("key")
+    cursor = api.workouts["key"][15]["start_time"]
+
+    workouts = h.get_workouts_since("key", cursor)
+    assert [workout["id"] for workout in workouts] == [f"key-{i}" for i in range(24, 8, -1)]
+    assert api.requests == [("key", 1), ("key", 2)]
+
+    api.requests.clear()
+    assert len(h.get_workouts_since("key", None)) == h.PAGE_SIZE
+    assert api.requests == [("key", 1)]
+
+
+def test_watch_maxes(api: StubApi, tmp_path: Path) -> None:
+    """Test that new week 3 top sets queue a change of the affected lift only, with one request per account per poll."""
+    for _ in range(12):
+        api.log("key-a")
+    athletes = [_athlete("a1", "key-a"), _athlete("a2", "key-a", squat_tm=270), _athlete("b", "key-b")]
+    conn = w.connect(str(tmp_path / "watch.db"))
+
+    # The first poll only sets the cursors, the second finds nothing new
+    assert m.watch_maxes(conn, athletes) == 0
+    assert m.watch_maxes(conn, athletes) == 0
+    assert sorted(api.requests) == [("key-a", 1), ("key-a", 1), ("key-b", 1), ("key-b", 1)]
+
+    # A wave 1 week 3 top set of a1's squat (0.75 * 300 = 225 lbs), 3 reps over, and b's first workout ever, a wave 2
+    # top set of bench (0.8 * 200 = 160 lbs)
+    api.log("key-a", _lifted("D04AC939", 1, 3, 300, 13))
+    api.log("key-b", _lifted("79D0BB3A", 2, 3, 200, 8))
+    api.requests.clear()
+    assert m.watch_maxes(conn, athletes) == 2
+    assert sorted(api.requests) == [("key-a", 1), ("key-b", 1)]
+
+    changes = {(change["athlete"], change["lift"]): change for change in w.get_changes(conn)}
+    assert set(changes) == {("a1", "squat"), ("b", "bench")}
+    squat = changes[("a1", "squat")]
+    assert (squat["wave"], squat["reps"], squat["old_tm"]) == (1, 13, 300)
+    assert squat["new_tm"] == a.compute_new_training_max(300, 225, 10, 13, m.SQUAT_INCREMENT, m.ONE_REP_MAX_THRESHOLD)
+    bench = changes[("b", "bench")]
+    assert (bench["wave"], bench["reps"], bench["old_tm"]) == (2, 8, 200)
+    assert bench["new_tm"] == a.compute_new_training_max(200, 160, 8, 8, m.BENCH_INCREMENT, m.ONE_REP_MAX_THRESHOLD)
+
+    # The same workouts aren't looked at again
+    assert m.watch_maxes(conn, athletes) == 0
+    assert len(w.get_changes(conn)) == 2
+
+
+def test_watch_maxes_matches_the_whole_protocol(api: StubApi, tmp_path: Path) -> None:
+    """Test that sets weighing the same as a week 3 top set don't count, and that the most recent wave wins."""
+    api.log("key")
+    athletes = [_athlete("a", "key")]
+    conn = w.connect(str(tmp_path / "watch.db"))
+    m.watch_maxes(conn, athletes)
+
+    # Wave 4 week 1 is 7x3 at 0.75 of the training max, the weight of the wave 1 week 3 top set
+    api.log("key", _lifted("D04AC939", 4, 1, 300, 3))
+    assert m.watch_maxes(conn, athletes) == 0
+
+    api.log("key", _lifted("D04AC939", 1, 3, 300, 12))
+    api.log("key", _lifted("D04AC939", 2, 3, 300, 9))
+    assert m.watch_maxes(conn, athletes) == 1
+    [change] = w.get_changes(conn)
+    assert (change["wave"], change["reps"]) == (2, 9)
+
+
+def test_watch_maxes_picks_up_late_workouts(api: StubApi, tmp_path: Path) -> None:
+    """Test that workouts logged after the fact, or starting with the cursor, are looked at once."""
+    for _ in range(5):
+        api.log("key")
+    athletes = [_athlete("a", "key")]
+    conn = w.connect(str(tmp_path / "watch.db"))
+    m.watch_maxes(conn, athletes)
+    cursor = h.parse_time(api.workouts["key"][0]["start_time"])
+
+    api.log("key", _lifted("D04AC939", 1, 3, 300, 12), day=cursor - timedelta(days=2))
+    api.log("key", _lifted("79D0BB3A", 1, 3, 200, 12), day=cursor)
+    assert m.watch_maxes(conn, athletes) == 2
+    assert m.watch_maxes(conn, athletes) == 0
+
+
+def test_approve(api: StubApi, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that approved changes are saved to the roster and no longer pending."""
+    roster = str(tmp_path / "roster.jsonl")
+    watch_file = str(tmp_path / "watch.db")
+    c.save_roster([_athlete("a1", "key-a"), _athlete("b", "key-b")], roster)
+    m._watch(lambda: c.load_roster(roster), watch_file, 0, True, None)
+    api.log("key-a", _lifted("D04AC939", 1, 3, 300, 13))
+    m._watch(lambda: c.load_roster(roster), watch_file, 0, True, None)
+
+    monkeypatch.setattr(builtins, "input", lambda prompt: "SAVE")
+    m._approve(watch_file, roster, True, None, False)
+
+    athletes = {athlete["name"]: athlete for athlete in c.load_roster(roster)}
+    assert athletes["a1"]["squat_tm"] > 300
+    assert athletes["b"]["squat_tm"] == 300
+    with closing(w.connect(watch_file)) as conn:
+        assert w.get_changes(conn) == []
+        assert len(w.get_changes(conn, "approved")) == 1